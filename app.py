@@ -1,3 +1,17 @@
-from mainSite import app
+import os
+from dotenv import load_dotenv
+# Green thread servers need the stdlib patched before anything else is
+# imported. .env is loaded first so the mode chosen here is the one
+# mainSite hands to SocketIO, which reads the same variable.
+load_dotenv()
+async_mode = os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+if async_mode == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif async_mode == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from mainSite import app, socket
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", debug=True)
\ No newline at end of file
+    socket.run(app, host="0.0.0.0", debug=True)
@@ -0,0 +1,15 @@
+# benchmarks/_env.py
+"""
+Imported by the benchmark scripts before anything from mainSite. Importing
+mainSite builds the app, so this gives it a throwaway database, token file
+and job queue, unless the caller's environment already names real ones.
+"""
+
+import os
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix='bench-')
+os.environ.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///' + os.path.join(_scratch, 'bench.db'))
+os.environ.setdefault('TOKEN_DB_PATH', os.path.join(_scratch, 'bench_tokens.db'))
+os.environ.setdefault('JOBS_DB_PATH', os.path.join(_scratch, 'bench_jobs.db'))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
@@ -0,0 +1,83 @@
+"""
+Benchmarks the bill totals engine over synthetic line items, grouped into
+bills, against a plain per-line Python loop like the one a report would
+run over BillItem objects.
+
+    python benchmarks/bill_totals.py --lines 1000000 --bills 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import _env  # noqa: F401  throwaway database, token file and job queue for the app
+
+from mainSite import bill_totals
+from mainSite.bill_totals import compute_totals, line_amounts
+
+class Line(object):
+    """Stand-in for a loaded BillItem with its product."""
+    def __init__(self, bill_id, quantity, mrp, discount_percent, gst_percent):
+        self.bill_id = bill_id
+        self.quantity = quantity
+        self.mrp = mrp
+        self.discount_percent = discount_percent
+        self.gst_percent = gst_percent
+
+def object_loop(lines):
+    totals = {}
+    for line in lines:
+        gross, discount, taxable, cgst, sgst = line_amounts(line.mrp, line.quantity, line.discount_percent, line.gst_percent)
+        bill = totals.setdefault(line.bill_id, {})
+        slab = bill.setdefault(line.gst_percent, [0, 0, 0, 0, 0])
+        slab[0] += gross
+        slab[1] += discount
+        slab[2] += taxable
+        slab[3] += cgst
+        slab[4] += sgst
+    return totals
+
+def timed(label, func, n):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"  {label:28} {elapsed:7.3f} s  {n / elapsed / 1e6:6.2f} M lines/s")
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lines', type=int, default=1000000)
+    parser.add_argument('--bills', type=int, default=100000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    n = args.lines
+    bill_ids = sorted(rng.randrange(args.bills) for _ in range(n))
+    quantity = [rng.randint(1, 10) for _ in range(n)]
+    mrp = [round(rng.uniform(1, 900), 2) for _ in range(n)]
+    discount = [rng.choice((0, 0, 0, 5, 10, 15)) for _ in range(n)]
+    gst = [rng.choice((0, 5, 12, 18, 28)) for _ in range(n)]
+    print(f"{n:,} line items over {len(set(bill_ids)):,} bills")
+
+    lines = [Line(*row) for row in zip(bill_ids, quantity, mrp, discount, gst)]
+    timed('per-object python loop', lambda: object_loop(lines), n)
+    del lines
+
+    python_result = timed('array fallback, grouped', lambda: compute_totals(
+        quantity, mrp, discount, gst, bill_ids=bill_ids, use_numpy=False), n)
+    timed('array fallback, one total', lambda: compute_totals(quantity, mrp, discount, gst, use_numpy=False), n)
+
+    np = bill_totals.np
+    if np is None:
+        print("  numpy not installed, skipping the vectorized path")
+        return
+    columns = (np.array(quantity), np.array(mrp), np.array(discount, dtype=float), np.array(gst, dtype=float))
+    ids = np.array(bill_ids)
+    numpy_result = timed('numpy, grouped', lambda: compute_totals(*columns, bill_ids=ids, use_numpy=True), n)
+    timed('numpy, one total', lambda: compute_totals(*columns, use_numpy=True), n)
+    print("  numpy and fallback agree:", numpy_result == python_result)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Login latency under a burst of concurrent sign-ins, with the password
+hasher limited to different numbers of concurrent hashes. Alongside the
+logins a client keeps polling /api/status, to show whether the burst
+starves unrelated requests.
+
+    python benchmarks/login_latency.py --logins 200 --clients 20 --slots 1 2 4
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import _env  # noqa: F401  throwaway database, token file and job queue for the app
+
+from mainSite import app
+from mainSite.extensions import db
+from mainSite.models import User
+from mainSite.passwords import PasswordHasher
+from mainSite.routes import auth
+
+PASSWORD = 'benchmark-password'
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 2)
+
+def login_once(phone):
+    client = app.test_client()
+    started = time.perf_counter()
+    response = client.post('/login', data={'phone': phone, 'password': PASSWORD})
+    return (time.perf_counter() - started) * 1000, response.status_code
+
+def run(args, slots, phones):
+    auth.hasher = PasswordHasher(method=args.method, concurrency=slots, wait_seconds=args.wait)
+    auth.hasher.prefix  # pay for the one-off policy hash before timing
+    status_ms = []
+    done = threading.Event()
+
+    def poll_status():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/api/status')
+            status_ms.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.005)
+
+    poller = threading.Thread(target=poll_status)
+    poller.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(login_once, (phones[i % len(phones)] for i in range(args.logins))))
+    wall = time.perf_counter() - started
+    done.set()
+    poller.join()
+    login_ms = [ms for ms, code in results if code == 302]
+    return {
+        'hash_slots': slots,
+        'logins_ok': len(login_ms),
+        'logins_busy': sum(1 for _, code in results if code == 503),
+        'logins_per_s': round(len(login_ms) / wall, 1),
+        'login_p50_ms': percentile(login_ms, 50),
+        'login_p99_ms': percentile(login_ms, 99),
+        'status_p50_ms': percentile(status_ms, 50),
+        'status_p99_ms': percentile(status_ms, 99),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=20, help='Concurrent login requests.')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--slots', type=int, nargs='+', default=[1, 2, 4], help='Hash concurrency limits to compare.')
+    parser.add_argument('--method', default='pbkdf2:sha256:100000', help='Hash method for the seeded passwords.')
+    parser.add_argument('--wait', type=float, default=30, help='Seconds a login waits for a hash slot.')
+    args = parser.parse_args()
+
+    # The form posts skip CSRF here; the login view itself is what is measured
+    app.config['WTF_CSRF_ENABLED'] = False
+    seeding = PasswordHasher(method=args.method)
+    with app.app_context():
+        db.create_all()
+        hashed = seeding.hash(PASSWORD)
+        phones = []
+        for i in range(args.users):
+            phone = f'{9000000000 + i}'
+            User.create_user(name=f'user {i}', phone=phone, gstno='X' * 15, password=hashed)
+            phones.append(phone)
+
+    print(json.dumps([run(args, slots, phones) for slots in args.slots], indent=2))
+
+if __name__ == '__main__':
+    main()
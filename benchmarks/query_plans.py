@@ -0,0 +1,131 @@
+"""
+Shows SQLite query plans and timings for the app's hot queries with and
+without the secondary indexes declared in mainSite/models.py.
+
+The schema is created from the models, every non-unique index is dropped,
+synthetic rows are seeded, and each query is explained and timed. Then
+the indexes are recreated and the same queries run again.
+
+    python benchmarks/query_plans.py --stores 200 --products 200 --bills 100
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import _env  # noqa: F401  throwaway database, token file and job queue for the app
+
+from sqlalchemy import create_engine
+from sqlalchemy.schema import CreateIndex
+from mainSite.extensions import db
+import mainSite.models  # noqa: F401  registers the tables on db.metadata
+
+QUERIES = {
+    'stores page for a user':
+        "SELECT * FROM stores WHERE user_id = :user_id ORDER BY created_at DESC, id DESC LIMIT 10",
+    'products page for a store':
+        "SELECT * FROM products WHERE store_id = :store_id ORDER BY created_at DESC, id DESC LIMIT 20",
+    'bills for a store in a month':
+        "SELECT * FROM bills WHERE store_id = :store_id AND billing_date >= :start AND billing_date < :end",
+    'bills across stores in a day':
+        "SELECT COUNT(*) FROM bills WHERE billing_date >= :start AND billing_date < :day_end",
+    'items of a bill':
+        "SELECT * FROM bill_items WHERE bill_id = :bill_id",
+    'bill items referencing a product':
+        "SELECT COUNT(*) FROM bill_items WHERE product_id = :product_id",
+}
+
+def seed(conn, args):
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    conn.executemany(
+        "INSERT INTO users (id, name, phone, gstno, created_at) VALUES (?, ?, ?, ?, ?)",
+        [(u, f'user {u}', f'{9000000000 + u}', 'X' * 15, start) for u in range(1, args.users + 1)]
+    )
+    conn.executemany(
+        "INSERT INTO stores (id, name, phone, owner, user_id, product_count, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(s, f'store {s}', '1', 'owner', rng.randint(1, args.users), args.products,
+          start + timedelta(minutes=s)) for s in range(1, args.stores + 1)]
+    )
+    product_id = 0
+    rows = []
+    for s in range(1, args.stores + 1):
+        for _ in range(args.products):
+            product_id += 1
+            rows.append((product_id, f'product {product_id}', 10, 12, 9.5, 'units', s,
+                         start + timedelta(seconds=product_id)))
+    conn.executemany(
+        "INSERT INTO products (id, name, quantity, gst_percent, mrp, quantity_unit, store_id, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+    )
+    bill_id = 0
+    bills, items = [], []
+    for s in range(1, args.stores + 1):
+        for _ in range(args.bills):
+            bill_id += 1
+            billed = start + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+            bills.append((bill_id, 'store', 'owner', billed, s, billed))
+            for _ in range(3):
+                items.append((1, 0.0, 12.0, 9.5, bill_id, rng.randint(1, product_id)))
+    conn.executemany(
+        "INSERT INTO bills (id, store_name, owner_name, billing_date, store_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        bills
+    )
+    conn.executemany(
+        "INSERT INTO bill_items (quantity, discount_percent, gst_percent, total_price, bill_id, product_id) "
+        "VALUES (?, ?, ?, ?, ?, ?)", items
+    )
+    conn.commit()
+    return {'user_id': 1, 'store_id': args.stores // 2, 'bill_id': bill_id // 2, 'product_id': product_id // 2,
+            'start': datetime(2025, 6, 1), 'end': datetime(2025, 7, 1), 'day_end': datetime(2025, 6, 2)}
+
+def report(conn, params, repeat):
+    for label, sql in QUERIES.items():
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params).fetchall()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        print(f"  {label:34} {elapsed:8.3f} ms  | {'; '.join(plan)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--stores', type=int, default=200)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--bills', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        engine = create_engine(f'sqlite:///{path}')
+        db.metadata.create_all(engine)
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes if not index.unique]
+        create_sql = [str(CreateIndex(index).compile(engine)) for index in indexes]
+        engine.dispose()
+
+        conn = sqlite3.connect(path)
+        for index in indexes:
+            conn.execute(f"DROP INDEX IF EXISTS {index.name}")
+        params = seed(conn, args)
+        conn.execute("ANALYZE")
+
+        print(f"Seeded {args.stores} stores, {args.stores * args.products} products, "
+              f"{args.stores * args.bills} bills\n")
+        print("Without indexes:")
+        report(conn, params, args.repeat)
+        for sql in create_sql:
+            conn.execute(sql)
+        conn.execute("ANALYZE")
+        print("\nWith indexes:")
+        report(conn, params, args.repeat)
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Seeds a synthetic dataset of users, stores, products and finalized bills
+into the database named by SQLALCHEMY_DATABASE_URI (SQLite or Postgres).
+Every user's password is PASSWORD. Rows go in with bulk inserts, then
+the product counters and sales rollups are rebuilt from them.
+
+    SQLALCHEMY_DATABASE_URI=sqlite:////tmp/bench.db python benchmarks/seed_data.py \\
+        --users 50 --stores 5 --products 500 --bills 200
+
+benchmarks/suite.py seeds a throwaway database with this on its own.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import _env  # noqa: F401  throwaway database, token file and job queue for the app
+
+from sqlalchemy import insert
+from mainSite.extensions import db
+from mainSite.models import User, Store, Product, Bill, BillItem, SalesRollup
+from mainSite.bill_totals import line_total
+from mainSite.passwords import hasher
+from mainSite.search_index import product_index
+
+PASSWORD = 'benchmark-password'
+FIRST_PHONE = 9000000000
+SYLLABLES = ('am', 'ox', 'cil', 'lin', 'para', 'ceta', 'mol', 'dolo', 'azi', 'thro', 'my', 'cin',
+             'metro', 'ni', 'da', 'zole', 'pan', 'to', 'pra', 'vita', 'cal', 'ci', 'um', 'zinc')
+FORMS = ('Tablet', 'Syrup', 'Capsule', 'Drops', 'Cream', 'Injection')
+
+def product_name(rng):
+    stem = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+    return f"{stem} {rng.choice((100, 250, 500, 650))} {rng.choice(FORMS)}"
+
+def _insert(model, rows, chunk=5000):
+    for start in range(0, len(rows), chunk):
+        db.session.execute(insert(model), rows[start:start + chunk])
+
+def seed(users=20, stores_per_user=5, products_per_store=200, bills_per_store=50, items_per_bill=4, seed=42):
+    """
+    Inserts the dataset and returns its shape. Ids are assigned here, after
+    the current maximum of each table, so it can also add to a seeded DB.
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    # One hash shared by every user keeps seeding fast; logins still pay the full cost
+    password = hasher.hash(PASSWORD)
+    next_id = {model: (db.session.query(db.func.max(model.id)).scalar() or 0) + 1
+               for model in (User, Store, Product, Bill, BillItem)}
+    first_phone = FIRST_PHONE + next_id[User] - 1
+
+    user_rows, store_rows, product_rows, bill_rows, item_rows = [], [], [], [], []
+    for u in range(users):
+        user_id = next_id[User] + u
+        user_rows.append({'id': user_id, 'name': f'Bench user {user_id}', 'phone': str(first_phone + u),
+                          'gstno': 'X' * 15, 'password': password, 'created_at': now})
+        for _ in range(stores_per_user):
+            store_id = next_id[Store] + len(store_rows)
+            store_rows.append({'id': store_id, 'user_id': user_id, 'name': f'Store {store_id}', 'phone': '1',
+                               'owner': f'Bench user {user_id}', 'product_count': products_per_store,
+                               'created_at': now - timedelta(minutes=len(store_rows))})
+            products = []
+            for _ in range(products_per_store):
+                product = {'id': next_id[Product] + len(product_rows), 'store_id': store_id,
+                           'name': product_name(rng), 'batch': f'B{rng.randint(1000, 9999)}',
+                           'quantity': 10 ** 6, 'gst_percent': rng.choice((0, 5, 12, 18)),
+                           'mrp': round(rng.uniform(5, 900), 2), 'quantity_unit': 'units',
+                           'expire': now + timedelta(days=rng.randint(-30, 720)), 'created_at': now}
+                product_rows.append(product)
+                products.append(product)
+            for _ in range(bills_per_store):
+                bill_id = next_id[Bill] + len(bill_rows)
+                billed_at = now - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 600))
+                bill_rows.append({'id': bill_id, 'store_id': store_id, 'status': 'final', 'billing_date': billed_at,
+                                  'store_name': f'Store {store_id}', 'owner_name': f'Bench user {user_id}',
+                                  'customer_name': 'Walk-in', 'created_at': billed_at})
+                for product in rng.sample(products, min(items_per_bill, len(products))):
+                    quantity = rng.randint(1, 5)
+                    discount = rng.choice((0, 0, 5, 10))
+                    item_rows.append({'bill_id': bill_id, 'product_id': product['id'], 'quantity': quantity,
+                                      'mrp': product['mrp'], 'discount_percent': discount, 'gst_percent': product['gst_percent'],
+                                      'total_price': line_total(product['mrp'], quantity, discount)})
+
+    for model, rows in ((User, user_rows), (Store, store_rows), (Product, product_rows),
+                        (Bill, bill_rows), (BillItem, item_rows)):
+        _insert(model, rows)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Explicit ids don't advance the serial sequences, so move them past the seeded rows
+        for model in next_id:
+            table = model.__tablename__
+            db.session.execute(db.text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"))
+    db.session.commit()
+    for store in store_rows:
+        SalesRollup.rebuild(store['id'])
+        product_index.invalidate(store['id'])
+    return {'users': len(user_rows), 'stores': len(store_rows), 'products': len(product_rows),
+            'bills': len(bill_rows), 'bill_items': len(item_rows)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--stores', type=int, default=5, help='Stores per user.')
+    parser.add_argument('--products', type=int, default=200, help='Products per store.')
+    parser.add_argument('--bills', type=int, default=50, help='Bills per store.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from mainSite import app
+    with app.app_context():
+        db.create_all()
+        shape = seed(args.users, args.stores, args.products, args.bills, seed=args.seed)
+    print(json.dumps({'database': os.environ['SQLALCHEMY_DATABASE_URI'], **shape}, indent=2))
+
+if __name__ == '__main__':
+    main()
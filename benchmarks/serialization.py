@@ -0,0 +1,77 @@
+"""
+Per-row CPU time and peak memory of turning one page of products into a
+JSON body: ORM objects with to_dict() and jsonify, against column-only
+records (mainSite/records.py) encoded with orjson, and with the stdlib
+json fallback. Each run starts from an empty session, as a request does.
+
+    python benchmarks/serialization.py --rows 100 --repeat 300
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import _env  # noqa: F401  throwaway database, token file and job queue for the app
+
+from flask import jsonify
+from mainSite import app, records
+from mainSite.extensions import db
+from mainSite.models import Product
+from mainSite.pagination import keyset_paginate
+from seed_data import seed
+
+def orm_page(store_id, rows):
+    page = keyset_paginate(Product.query.filter_by(store_id=store_id), Product, None, rows)
+    return jsonify({"products": [product.to_dict() for product in page.items], "status": "ok"}).get_data()
+
+def records_page(store_id, rows):
+    page = keyset_paginate(records.select_records(records.ProductRecord, Product.store_id == store_id), Product, None, rows)
+    items = records.records(records.ProductRecord, page.items)
+    return records.json_response({"products": records.to_dicts(items), "status": "ok"}).get_data()
+
+def measure(render, store_id, rows, repeat):
+    render(store_id, rows)  # warm up
+    db.session.remove()
+    cpu = 0.0
+    for _ in range(repeat):
+        started = time.process_time()
+        body = render(store_id, rows)
+        cpu += time.process_time() - started
+        db.session.remove()
+    tracemalloc.start()
+    render(store_id, rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.remove()
+    return {
+        'cpu_us_per_row': round(cpu / repeat / rows * 1e6, 2),
+        'peak_bytes_per_row': round(peak / rows),
+        'body_bytes': len(body),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100, help='Products per page.')
+    parser.add_argument('--repeat', type=int, default=300)
+    args = parser.parse_args()
+
+    orjson = records.orjson
+    results = {'rows': args.rows, 'orjson': orjson is not None}
+    with app.app_context():
+        db.create_all()
+        seed(users=1, stores_per_user=1, products_per_store=args.rows, bills_per_store=0)
+        store_id = db.session.query(Product.store_id).limit(1).scalar()
+        with app.test_request_context():
+            results['orm_to_dict_jsonify'] = measure(orm_page, store_id, args.rows, args.repeat)
+            results['records_json'] = measure(records_page, store_id, args.rows, args.repeat)
+            if orjson is not None:
+                records.orjson = None
+                results['records_stdlib_json'] = measure(records_page, store_id, args.rows, args.repeat)
+                records.orjson = orjson
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+SocketIO load test: opens many simulated clients against a running
+server, spreads them over rooms with the 'join' event and measures how
+long room broadcasts take to reach every member.
+
+Start the app first (e.g. SOCKETIO_ASYNC_MODE=eventlet python app.py,
+or several workers sharing SOCKETIO_MESSAGE_QUEUE), then:
+
+    python benchmarks/socket_load.py --url http://localhost:5000 --clients 2000 --rooms 50
+
+Needs python-socketio's asyncio client (pip install "python-socketio[asyncio_client]").
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import socketio
+
+async def open_client(url, stats, connect_timeout):
+    client = socketio.AsyncClient(reconnection=False)
+    received = asyncio.Queue()
+
+    @client.on('message')
+    async def on_message(data):
+        await received.put(time.perf_counter())
+
+    started = time.perf_counter()
+    try:
+        await client.connect(url, transports=['websocket'], wait_timeout=connect_timeout)
+    except Exception:
+        stats['connect_errors'] += 1
+        return None, None
+    stats['connect_ms'].append((time.perf_counter() - started) * 1000)
+    return client, received
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run(args):
+    stats = {'connect_ms': [], 'connect_errors': 0, 'fanout_ms': [], 'missed': 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited_open():
+        async with semaphore:
+            return await open_client(args.url, stats, args.timeout)
+
+    started = time.perf_counter()
+    clients = [c for c in await asyncio.gather(*(limited_open() for _ in range(args.clients))) if c[0]]
+    connect_wall = time.perf_counter() - started
+
+    rooms = {}
+    for i, (client, received) in enumerate(clients):
+        rooms.setdefault(f'load-{i % args.rooms}', []).append((client, received))
+
+    # Every member joins its room; each join is broadcast to the members already in it
+    for room, members in rooms.items():
+        for client, _ in members:
+            await client.emit('join', {'room': room})
+    await asyncio.sleep(1)
+    for _, received in clients:
+        while not received.empty():
+            received.get_nowait()
+
+    # One member per room triggers a broadcast, the rest time its arrival
+    for _ in range(args.rounds):
+        for room, members in rooms.items():
+            sent = time.perf_counter()
+            await members[0][0].emit('join', {'room': room})
+            for _, received in members:
+                try:
+                    arrived = await asyncio.wait_for(received.get(), args.timeout)
+                    stats['fanout_ms'].append((arrived - sent) * 1000)
+                except asyncio.TimeoutError:
+                    stats['missed'] += 1
+
+    await asyncio.gather(*(client.disconnect() for client, _ in clients), return_exceptions=True)
+
+    fanout = stats['fanout_ms']
+    return {
+        'clients_requested': args.clients,
+        'clients_connected': len(clients),
+        'connect_errors': stats['connect_errors'],
+        'connect_wall_s': round(connect_wall, 3),
+        'connects_per_s': round(len(clients) / connect_wall, 1) if connect_wall else None,
+        'connect_p50_ms': percentile(stats['connect_ms'], 50),
+        'connect_p99_ms': percentile(stats['connect_ms'], 99),
+        'rooms': len(rooms),
+        'deliveries': len(fanout),
+        'missed_deliveries': stats['missed'],
+        'fanout_p50_ms': percentile(fanout, 50),
+        'fanout_p95_ms': percentile(fanout, 95),
+        'fanout_p99_ms': percentile(fanout, 99),
+        'fanout_mean_ms': statistics.fmean(fanout) if fanout else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=200, help='Connections opened at once.')
+    parser.add_argument('--timeout', type=float, default=10)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+if __name__ == '__main__':
+    main()
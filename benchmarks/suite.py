@@ -0,0 +1,302 @@
+"""
+Benchmark suite: seeds a synthetic dataset, drives the app through its
+real routes and reports throughput and p50/p95/p99 latency per scenario
+as JSON, for comparing runs over time.
+
+Scenarios:
+  login             POST /login with a seeded user's password
+  stores_paginated  scroll /api/stores_paginated page by page via next_cursor
+  create_store      GET /api/request_token, then POST /api/new_store with it
+  product_search    GET /api/stores/<id>/products/search with a name prefix
+  bill_finalize     POST /api/stores/<id>/bills with a few random lines
+
+By default the app runs in-process behind the Flask test client against
+a fresh SQLite file. With --url the same scenarios go over HTTP to a
+running server, whose database must have been seeded with
+benchmarks/seed_data.py (pass the same --users) and whose rate limits
+must allow the load, since every request comes from one address.
+
+    python benchmarks/suite.py --threads 8 --duration 10 --output results.json
+    python benchmarks/suite.py --url http://localhost:5000 --scenarios login product_search
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+from urllib.parse import quote, urlencode
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import _env  # noqa: F401  throwaway database, token file and job queue for the app
+os.environ.setdefault('WTF_CSRF_SECRET_KEY', 'benchmark')
+# Every simulated client shares one address, so lift the per-IP limits in-process
+os.environ.setdefault('RATE_LIMIT_LOGIN', '1000000/second')
+os.environ.setdefault('RATE_LIMIT_REQUEST_TOKEN', '1000000/second')
+
+from seed_data import PASSWORD, FIRST_PHONE, seed
+
+CSRF_INPUT = re.compile(r'value="([^"]+)" name="csrf_token"')
+
+class TestClientSession(object):
+    """One simulated user talking to the in-process app."""
+    def __init__(self, app):
+        self.client = app.test_client()
+        # Sent as X-CSRFToken on JSON posts, as the site's scripts do
+        self.csrf_token = None
+
+    def get(self, path):
+        response = self.client.get(path)
+        return response.status_code, response.get_json(silent=True)
+
+    def post_form(self, path, data):
+        response = self.client.post(path, data=data)
+        return response.status_code, response.get_json(silent=True)
+
+    def post_json(self, path, payload):
+        headers = {'X-CSRFToken': self.csrf_token} if self.csrf_token else {}
+        response = self.client.post(path, json=payload, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+    def login_form_token(self):
+        return CSRF_INPUT.search(self.client.get('/login').get_data(as_text=True)).group(1)
+
+class HTTPSession(object):
+    """One simulated user talking to a running server, with its own cookies."""
+    def __init__(self, base_url):
+        class LocalCookiePolicy(http.cookiejar.DefaultCookiePolicy):
+            # The app marks its cookies Secure; a local benchmark server is plain http
+            def return_ok_secure(self, cookie, request):
+                return True
+
+        class NoRedirect(urllib.request.HTTPRedirectHandler):
+            def redirect_request(self, *args, **kwargs):
+                return None
+
+        self.base_url = base_url.rstrip('/')
+        self.csrf_token = None
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar(LocalCookiePolicy())), NoRedirect())
+
+    def _open(self, request):
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def _send(self, path, body=None, content_type=None):
+        request = urllib.request.Request(self.base_url + path, data=body)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        if body is not None and self.csrf_token:
+            request.add_header('X-CSRFToken', self.csrf_token)
+        status, raw = self._open(request)
+        try:
+            return status, json.loads(raw)
+        except ValueError:
+            return status, raw.decode('utf-8', 'replace')
+
+    def get(self, path):
+        return self._send(path)
+
+    def post_form(self, path, data):
+        return self._send(path, urlencode(data).encode(), 'application/x-www-form-urlencoded')
+
+    def post_json(self, path, payload):
+        return self._send(path, json.dumps(payload).encode(), 'application/json')
+
+    def login_form_token(self):
+        return CSRF_INPUT.search(self.get('/login')[1]).group(1)
+
+class Worker(object):
+    """A logged in user with the ids its scenarios pick from."""
+    def __init__(self, session, user_index, rng):
+        self.session = session
+        self.phone = str(FIRST_PHONE + user_index)
+        self.rng = rng
+        self.cursor = None
+        self.stores = []
+        self.products = {}
+
+    def login(self):
+        status, _ = self.session.post_form('/login', {
+            'phone': self.phone, 'password': PASSWORD, 'csrf_token': self.session.login_form_token(),
+        })
+        if status != 302:
+            return False
+        _, token = self.session.get('/api/csrf_token')
+        self.session.csrf_token = token['csrf_token']
+        return True
+
+    def load_catalog(self):
+        """Reads the user's stores and a page of each store's products."""
+        cursor = None
+        while True:
+            _, page = self.session.get('/api/stores_paginated?per_page=100' + (f'&cursor={cursor}' if cursor else ''))
+            self.stores.extend(store['id'] for store in page['stores'])
+            cursor = page.get('next_cursor')
+            if not page.get('has_next'):
+                break
+        for store_id in self.stores:
+            _, page = self.session.get(f'/api/stores/{store_id}/products?per_page=100')
+            self.products[store_id] = [(p['id'], p['name']) for p in page.get('products', [])]
+        self.stores = [store_id for store_id in self.stores if self.products.get(store_id)]
+
+def scenario_login(worker):
+    return worker.login()
+
+def scenario_stores_paginated(worker):
+    path = '/api/stores_paginated?per_page=9' + (f'&cursor={worker.cursor}' if worker.cursor else '')
+    status, page = worker.session.get(path)
+    # Start over from the top once the last page is reached
+    worker.cursor = page.get('next_cursor') if status == 200 and page.get('has_next') else None
+    return status == 200
+
+def scenario_create_store(worker):
+    status, token = worker.session.get('/api/request_token')
+    if status != 200:
+        return False
+    status, _ = worker.session.post_form('/api/new_store', {
+        'publish_token': token['publish_token'], 'storeName': 'Benchmark store', 'ownerName': 'Bench',
+        'phoneNum': '1', 'address1': 'Street', 'address2': 'Town', 'gstNo': 'X' * 15,
+    })
+    return status == 200
+
+def scenario_product_search(worker):
+    store_id = worker.rng.choice(worker.stores)
+    _, name = worker.rng.choice(worker.products[store_id])
+    query = name[:worker.rng.randint(3, 6)]
+    status, _ = worker.session.get(f'/api/stores/{store_id}/products/search?q={quote(query)}')
+    return status == 200
+
+def scenario_bill_finalize(worker):
+    store_id = worker.rng.choice(worker.stores)
+    lines = worker.rng.sample(worker.products[store_id], min(3, len(worker.products[store_id])))
+    status, _ = worker.session.post_json(f'/api/stores/{store_id}/bills', {
+        'customer_name': 'Benchmark', 'items': [{'product_id': product_id, 'quantity': 1} for product_id, _ in lines],
+    })
+    return status == 201
+
+SCENARIOS = {
+    'login': scenario_login,
+    'stores_paginated': scenario_stores_paginated,
+    'create_store': scenario_create_store,
+    'product_search': scenario_product_search,
+    'bill_finalize': scenario_bill_finalize,
+}
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 3)
+
+def run_scenario(name, workers, duration, max_ops):
+    scenario = SCENARIOS[name]
+    latencies = [[] for _ in workers]
+    errors = [0] * len(workers)
+    deadline = time.perf_counter() + duration
+
+    def drive(i):
+        worker = workers[i]
+        while time.perf_counter() < deadline and len(latencies[i]) + errors[i] < max_ops:
+            started = time.perf_counter()
+            try:
+                ok = scenario(worker)
+            except Exception:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            if ok:
+                latencies[i].append(elapsed)
+            else:
+                errors[i] += 1
+
+    threads = [threading.Thread(target=drive, args=(i,)) for i in range(len(workers))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    samples = [ms for worker_ms in latencies for ms in worker_ms]
+    return {
+        'ops': len(samples),
+        'errors': sum(errors),
+        'throughput_per_s': round(len(samples) / wall, 1) if wall else None,
+        'p50_ms': percentile(samples, 50),
+        'p95_ms': percentile(samples, 95),
+        'p99_ms': percentile(samples, 99),
+        'mean_ms': round(statistics.fmean(samples), 3) if samples else None,
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Benchmark a running server instead of the in-process app.')
+    parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--threads', type=int, default=4, help='Concurrent simulated users.')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds per scenario.')
+    parser.add_argument('--max-ops', type=int, default=10 ** 9, help='Operations per thread per scenario.')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--stores', type=int, default=5, help='Stores per user.')
+    parser.add_argument('--products', type=int, default=200, help='Products per store.')
+    parser.add_argument('--bills', type=int, default=50, help='Bills per store.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Also write the JSON report to this file.')
+    args = parser.parse_args()
+
+    dataset = None
+    if args.url:
+        make_session = lambda: HTTPSession(args.url)
+    else:
+        from mainSite import app
+        from mainSite.extensions import db
+        with app.app_context():
+            db.create_all()
+            dataset = seed(args.users, args.stores, args.products, args.bills, seed=args.seed)
+        make_session = lambda: TestClientSession(app)
+
+    workers = []
+    for i in range(args.threads):
+        worker = Worker(make_session(), i % args.users, random.Random(args.seed + i))
+        if not worker.login():
+            raise SystemExit(f'Could not log in as {worker.phone}; is the database seeded?')
+        worker.load_catalog()
+        workers.append(worker)
+
+    report = {
+        'meta': {
+            'started_at': datetime.utcnow().isoformat(),
+            'revision': git_revision(),
+            'target': args.url or 'test_client',
+            'database': None if args.url else os.environ['SQLALCHEMY_DATABASE_URI'],
+            'dataset': dataset,
+            'threads': args.threads,
+            'duration_s': args.duration,
+            'python': sys.version.split()[0],
+        },
+        'scenarios': {name: run_scenario(name, workers, args.duration, args.max_ops) for name in args.scenarios},
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+if __name__ == '__main__':
+    main()
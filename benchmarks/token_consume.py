@@ -0,0 +1,75 @@
+"""
+Concurrency stress test for single-use publish tokens.
+
+Fires many threads at one token and checks that exactly one of them
+consumes it, then measures consume throughput over many tokens.
+
+    python benchmarks/token_consume.py --threads 500 --tokens 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import _env  # noqa: F401  throwaway database, token file and job queue for the app
+
+from mainSite.token_store import MemoryTokenStore, SQLiteTokenStore
+
+def race_one_token(store, threads):
+    token = store.issue_publish_token()
+    barrier = threading.Barrier(threads)
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        barrier.wait()
+        ok = store.consume_publish_token(token)
+        with lock:
+            results.append(ok)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return sum(results), elapsed
+
+def consume_throughput(store, tokens, threads):
+    issued = [store.issue_publish_token() for _ in range(tokens)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        consumed = sum(pool.map(store.consume_publish_token, issued))
+    elapsed = time.perf_counter() - start
+    return consumed, tokens / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=300)
+    parser.add_argument('--tokens', type=int, default=2000)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {
+            'sqlite': SQLiteTokenStore(os.path.join(tmp, 'tokens.db'), purge_interval=0),
+            'memory': MemoryTokenStore(purge_interval=0),
+        }
+        for name, store in stores.items():
+            winners, elapsed = race_one_token(store, args.threads)
+            consumed, rate = consume_throughput(store, args.tokens, min(args.threads, 32))
+            print(f"{name:7} race: {winners}/{args.threads} threads won in {elapsed * 1000:.1f} ms | "
+                  f"throughput: {consumed}/{args.tokens} consumed, {rate:,.0f} tokens/s")
+            if winners != 1 or consumed != args.tokens:
+                failed = True
+    if failed:
+        print('FAIL: a token was consumed more or less than exactly once')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Requests/sec of the stores listing endpoint with and without the user
+cache behind Flask-Login's user loader, through the Flask test client
+against a throwaway SQLite file.
+
+    python benchmarks/user_loading.py --requests 3000 --stores 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import _env  # noqa: F401  throwaway database, token file and job queue for the app
+
+from sqlalchemy import event
+from mainSite import app
+from mainSite.extensions import db
+from mainSite.models import User, Store
+from mainSite.user_cache import user_cache
+
+def seed(stores):
+    user = User.create_user(name='bench', phone='9000000000', gstno='X' * 15)
+    for i in range(stores):
+        db.session.add(Store(user_id=user.id, name=f'store {i}', phone='1', owner='bench'))
+    db.session.commit()
+    return user.id
+
+def run(client, requests, counter):
+    counter['queries'] = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/api/stores_paginated?per_page=10')
+        assert response.status_code == 200, response.status_code
+    elapsed = time.perf_counter() - started
+    return {
+        'requests_per_s': round(requests / elapsed, 1),
+        'queries_per_request': round(counter['queries'] / requests, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--stores', type=int, default=50)
+    args = parser.parse_args()
+
+    counter = {'queries': 0}
+    with app.app_context():
+        db.create_all()
+        user_id = seed(args.stores)
+
+        def count(*_):
+            counter['queries'] += 1
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    results = {}
+    ttl = user_cache.ttl
+    for label, cache_ttl in (('without_cache', 0), ('with_cache', ttl)):
+        user_cache.clear()
+        user_cache.ttl = cache_ttl
+        run(client, 50, counter)  # warm up
+        results[label] = run(client, args.requests, counter)
+    results['speedup'] = round(results['with_cache']['requests_per_s'] / results['without_cache']['requests_per_s'], 2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,28 @@
-from flask import Flask, render_template, request
+from dotenv import load_dotenv
+# The modules below read their settings with os.getenv as they are
+# imported, so .env has to be loaded before any of them
+load_dotenv()
+
+from flask import Flask, render_template, request, jsonify
 from flask_login import LoginManager
 from flask_socketio import join_room, leave_room, send, emit
-from dotenv import load_dotenv
 from .utils import slugify, split
 from .extensions import db, login_manager, migrate, csrf, socket
 from .models import User
+from .user_cache import user_cache
+from .fragment_cache import fragments, FragmentCacheExtension
+from .rate_limit import RateLimited
+from .bill_drafts import drafts
+from . import metrics, static_assets
+from werkzeug.exceptions import HTTPException
 from .routes.api import api_bp
 from .routes.views import views_bp
 from .routes.auth import auth_bp
+from .routes import sockets
+from .commands import register_commands
 from werkzeug.middleware.proxy_fix import ProxyFix
 import os
 
-load_dotenv()
 database_url = os.getenv('SQLALCHEMY_DATABASE_URI')
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
@@ -22,30 +33,63 @@ app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_DOMAIN'] = None
 app.jinja_env.filters['slugify'] = slugify
 app.jinja_env.filters['split'] = split
+app.jinja_env.add_extension(FragmentCacheExtension)
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-# app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
+# Behind reverse proxies, TRUSTED_PROXY_HOPS says how many of them to take
+# X-Forwarded-* from, so request.remote_addr (which rate limits key on),
+# the scheme and the host are the client's. At 0 the headers are ignored,
+# since a client could forge them.
+app.config['TRUSTED_PROXY_HOPS'] = int(os.getenv('TRUSTED_PROXY_HOPS', 0))
+if app.config['TRUSTED_PROXY_HOPS']:
+    hops = app.config['TRUSTED_PROXY_HOPS']
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops, x_prefix=hops)
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(api_bp)
 app.register_blueprint(views_bp)
+register_commands(app)
 
 db.init_app(app)
 migrate.init_app(app, db)
 login_manager.init_app(app)
 csrf.init_app(app)
-socket.init_app(app, cors_allowed_origins="*", async_mode='threading')
+metrics.init_app(app)
+static_assets.init_app(app)
+metrics.register_stats('draft_cache', drafts.stats)
+metrics.register_stats('user_cache', user_cache.stats)
+metrics.register_stats('fragment_cache', fragments.stats)
+# SOCKETIO_ASYNC_MODE=eventlet or gevent serves websockets on green threads
+# (app.py monkey patches for them). A message queue such as
+# redis://localhost:6379/0 relays room broadcasts between worker processes.
+socket.init_app(
+    app,
+    cors_allowed_origins="*",
+    async_mode=os.getenv('SOCKETIO_ASYNC_MODE', 'threading'),
+    message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE') or None,
+    channel=os.getenv('SOCKETIO_CHANNEL', 'flask-socketio'),
+)
 
 login_manager = LoginManager(app)
 @login_manager.user_loader
 def load_user(user_id):
     try:
-        return User.query.get(user_id)
+        return user_cache.get(user_id)
     except Exception as e:
         return None
     
+@app.errorhandler(RateLimited)
+def handle_rate_limited(error):
+    headers = {'Retry-After': str(error.retry_after)}
+    if request.path.startswith('/api/'):
+        return jsonify({"status": "error", "message": str(error), "retry_after": error.retry_after}), 429, headers
+    return render_template('errors.html', error=error), 429, headers
+
 @app.errorhandler(Exception)
 def handle_exception(error):
-    print(error, Exception)
+    # 404s, 405s and the like keep their own status instead of becoming 500s
+    if isinstance(error, HTTPException):
+        return error
+    app.logger.exception("Unhandled error on %s %s", request.method, request.path)
     return render_template('errors.html', error=error), 500
 
 @socket.on('join')
@@ -0,0 +1,80 @@
+# mainSite/analytics.py
+
+from datetime import date
+from sqlalchemy import select, func
+from .extensions import db
+from .models import Product, SalesRollup
+
+# Every query here reads sales_rollups only (plus product names for the
+# few top products), so its cost follows the date range asked for, not
+# how many bills a store has.
+
+INTERVALS = ('day', 'month')
+TOP_PRODUCTS_ORDER = ('revenue', 'quantity', 'gst')
+MAX_TOP_PRODUCTS = 100
+
+def parse_day_range(start, end):
+    """Turns optional YYYY-MM-DD strings into dates. Raises ValueError on a bad date."""
+    return (date.fromisoformat(start) if start else None, date.fromisoformat(end) if end else None)
+
+def _in_range(statement, store_id, start_day, end_day):
+    statement = statement.where(SalesRollup.store_id == store_id)
+    if start_day:
+        statement = statement.where(SalesRollup.day >= start_day)
+    if end_day:
+        statement = statement.where(SalesRollup.day <= end_day)
+    return statement
+
+def _amounts(quantity, revenue, gst):
+    return {'quantity': quantity, 'revenue': revenue / 100, 'gst': gst / 100}
+
+def sales_series(store_id, start_day=None, end_day=None, interval='day'):
+    """
+    Returns units sold, revenue and GST collected per day or per month over
+    an inclusive date range, oldest first, plus the totals for the range.
+    """
+    statement = _in_range(
+        select(SalesRollup.day, func.sum(SalesRollup.quantity), func.sum(SalesRollup.revenue), func.sum(SalesRollup.gst))
+        .group_by(SalesRollup.day)
+        .order_by(SalesRollup.day),
+        store_id, start_day, end_day,
+    )
+    # Daily sums come from the database; months are folded here, which keeps
+    # the query portable and is at most a few hundred rows a year.
+    periods = {}
+    for day, quantity, revenue, gst in db.session.execute(statement):
+        period = day.isoformat() if interval == 'day' else day.strftime('%Y-%m')
+        sums = periods.setdefault(period, [0, 0, 0])
+        sums[0] += quantity
+        sums[1] += revenue
+        sums[2] += gst
+    totals = [sum(sums[k] for sums in periods.values()) for k in range(3)]
+    return {
+        'interval': interval,
+        'series': [{'period': period, **_amounts(*sums)} for period, sums in periods.items()],
+        'totals': _amounts(*totals),
+    }
+
+def top_products(store_id, start_day=None, end_day=None, order_by='revenue', limit=10):
+    """Returns the store's best selling products over an inclusive date range."""
+    quantity = func.sum(SalesRollup.quantity).label('quantity')
+    revenue = func.sum(SalesRollup.revenue).label('revenue')
+    gst = func.sum(SalesRollup.gst).label('gst')
+    ordering = {'revenue': revenue, 'quantity': quantity, 'gst': gst}[order_by]
+    statement = _in_range(
+        select(SalesRollup.product_id, quantity, revenue, gst)
+        .group_by(SalesRollup.product_id)
+        .order_by(ordering.desc(), SalesRollup.product_id)
+        .limit(limit),
+        store_id, start_day, end_day,
+    )
+    rows = db.session.execute(statement).all()
+    names = dict(db.session.execute(
+        select(Product.id, Product.name).where(Product.id.in_([row.product_id for row in rows]))
+    ).all()) if rows else {}
+    return [{
+        'product_id': row.product_id,
+        # A product deleted since it was sold keeps its sales, just not its name
+        'name': names.get(row.product_id),
+        **_amounts(row.quantity, row.revenue, row.gst),
+    } for row in rows]
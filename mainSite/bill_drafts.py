@@ -0,0 +1,312 @@
+# mainSite/bill_drafts.py
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from .extensions import db, socket
+from .search_index import product_index
+
+logger = logging.getLogger(__name__)
+
+def bill_room(bill_id):
+    return f"bill:{bill_id}"
+
+class DraftError(ValueError):
+    """Raised for a delta that can't be applied to a draft."""
+
+class DraftLine(object):
+    """One line of a draft with the product details it was billed at."""
+    __slots__ = ('product_id', 'name', 'batch', 'mrp', 'gst_percent', 'discount_percent', 'quantity')
+
+    def __init__(self, product_id, name, batch, mrp, gst_percent, discount_percent=0.0, quantity=0):
+        self.product_id = product_id
+        self.name = name
+        self.batch = batch
+        self.mrp = mrp
+        self.gst_percent = gst_percent
+        self.discount_percent = discount_percent
+        self.quantity = quantity
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def size_estimate(self):
+        # Slots object plus its two strings; numbers are shared small objects
+        return 120 + len(self.name) + len(self.batch or '')
+
+class BillDraft(object):
+    """
+    In-memory state of a draft bill being edited at the counter. Every
+    applied delta bumps version; dirty marks changes not yet saved.
+    finalized is set, under lock, once the bill is being finalized, after
+    which no delta is applied and nothing is saved. saved_version is the
+    version last read from or written to the bill's draft_version.
+    """
+    def __init__(self, bill_id, store_id, user_id, lines=None, version=0):
+        self.bill_id = bill_id
+        self.store_id = store_id
+        self.user_id = user_id
+        # product_id -> DraftLine, in the order products were added
+        self.lines = dict((line.product_id, line) for line in (lines or []))
+        self.version = version
+        self.saved_version = version
+        self.dirty = False
+        self.finalized = False
+        self.last_access = time.monotonic()
+        self.lock = threading.Lock()
+        # Serializes saves of this copy, so each one starts from the last one's version
+        self.save_lock = threading.Lock()
+
+    def snapshot(self):
+        return {
+            'bill_id': self.bill_id,
+            'version': self.version,
+            'lines': [line.to_dict() for line in self.lines.values()],
+        }
+
+    def size_estimate(self):
+        return 400 + sum(line.size_estimate() for line in self.lines.values())
+
+    def apply(self, delta, product_lookup):
+        """
+        Applies one delta and returns the message to broadcast. Deltas are
+        {'op': 'add', 'product_id', 'quantity'} to add or take away units,
+        {'op': 'set_quantity', 'product_id', 'quantity'} and
+        {'op': 'remove', 'product_id'}. A line whose quantity reaches 0 is
+        removed. The broadcast carries the resulting line (or None when it
+        was removed), so clients converge even if they missed the op itself.
+        """
+        op = delta.get('op')
+        try:
+            product_id = int(delta['product_id'])
+            quantity = int(delta.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            raise DraftError("A delta needs a product_id and a whole number quantity.")
+        with self.lock:
+            if self.finalized:
+                raise DraftError("This bill has been finalized.")
+            line = self.lines.get(product_id)
+            if op == 'add':
+                if line is None:
+                    if quantity <= 0:
+                        raise DraftError("Can't take units away from a product that isn't on the bill.")
+                    line = product_lookup(self.store_id, product_id)
+                    if line is None:
+                        raise DraftError("Unknown product for this store.")
+                    self.lines[product_id] = line
+                line.quantity += quantity
+            elif op == 'set_quantity':
+                if line is None:
+                    raise DraftError("That product isn't on the bill.")
+                line.quantity = quantity
+            elif op == 'remove':
+                if line is None:
+                    raise DraftError("That product isn't on the bill.")
+                line.quantity = 0
+            else:
+                raise DraftError(f"Unknown op: {op}")
+            if line.quantity <= 0:
+                del self.lines[product_id]
+                line = None
+            self.version += 1
+            self.dirty = True
+            return {
+                'bill_id': self.bill_id,
+                'version': self.version,
+                'op': op,
+                'product_id': product_id,
+                'line': line.to_dict() if line else None,
+            }
+
+def product_line(store_id, product_id):
+    """Loads the snapshot kept on a draft line for a product, or None."""
+    from .models import Product
+    product = (
+        db.session.query(Product.id, Product.name, Product.batch, Product.mrp, Product.gst_percent)
+        .filter(Product.id == product_id, Product.store_id == store_id)
+        .first()
+    )
+    if product is None:
+        return None
+    return DraftLine(product.id, product.name, product.batch, product.mrp, product.gst_percent)
+
+def load_draft(bill_id):
+    """
+    Loads a draft bill and its lines from the DB in two queries, or returns
+    None. Saved lines keep the MRP and GST they were added to the draft at.
+    The version carries on from the last saved one, so it keeps
+    increasing for clients across an eviction and reload.
+    """
+    from .models import Store, Product, Bill, BillItem
+    bill = (
+        db.session.query(Bill.id, Bill.store_id, Bill.draft_version, Store.user_id)
+        .join(Store, Store.id == Bill.store_id)
+        .filter(Bill.id == bill_id, Bill.status == 'draft')
+        .first()
+    )
+    if bill is None:
+        return None
+    rows = (
+        db.session.query(BillItem.product_id, Product.name, Product.batch, BillItem.mrp,
+                         BillItem.gst_percent, BillItem.discount_percent, BillItem.quantity)
+        .join(Product, Product.id == BillItem.product_id)
+        .filter(BillItem.bill_id == bill_id)
+        .order_by(BillItem.id)
+    )
+    lines = [DraftLine(*row) for row in rows]
+    return BillDraft(bill.id, bill.store_id, bill.user_id, lines, version=bill.draft_version)
+
+class DraftCache(object):
+    """
+    Open drafts of this process, keyed by bill id. Edits only touch memory;
+    save_dirty() writes each changed draft once, however many deltas it got.
+    Drafts idle for longer than ttl, or least recently used ones beyond
+    max_entries or max_bytes, are written back and evicted.
+
+    With several worker processes each can hold a copy of the same draft.
+    Saves compare and swap on the bill's draft_version, so a copy that
+    another process saved over since it was loaded is never written; it
+    is dropped instead. The saved bill is then reloaded and sent to the
+    bill's room as bill_state (or bill_error once it has been finalized),
+    so clients replace the edits that copy had acknowledged.
+    """
+    def __init__(self, max_entries=1000, ttl=1800, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._drafts = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.writebacks = 0
+        self.conflicts = 0
+
+    def get(self, bill_id):
+        with self._lock:
+            draft = self._drafts.get(bill_id)
+            if draft is not None:
+                self._drafts.move_to_end(bill_id)
+                draft.last_access = time.monotonic()
+                self.hits += 1
+                return draft
+            self.misses += 1
+        draft = load_draft(bill_id)
+        if draft is None:
+            return None
+        with self._lock:
+            draft = self._drafts.setdefault(bill_id, draft)
+            self._drafts.move_to_end(bill_id)
+            evicted = self._pop_over_capacity()
+        self._write_back(evicted)
+        return draft
+
+    def apply(self, bill_id, delta):
+        draft = self.get(bill_id)
+        if draft is None:
+            raise DraftError("Draft bill not found.")
+        return draft.apply(delta, product_line)
+
+    def _pop_over_capacity(self):
+        # Called with self._lock held; the caller writes the drafts back
+        evicted = []
+        total = sum(draft.size_estimate() for draft in self._drafts.values())
+        while len(self._drafts) > 1 and (len(self._drafts) > self.max_entries or total > self.max_bytes):
+            _, draft = self._drafts.popitem(last=False)
+            total -= draft.size_estimate()
+            evicted.append(draft)
+        self.evictions += len(evicted)
+        return evicted
+
+    def _write_back(self, drafts):
+        for draft in drafts:
+            try:
+                self.save(draft)
+            except Exception:
+                # Losing an unsaved edit is better than losing the whole cache
+                logger.exception("Writing back evicted draft %s failed", draft.bill_id)
+
+    def save(self, draft):
+        from .models import Bill
+        with draft.save_lock:
+            with draft.lock:
+                if not draft.dirty or draft.finalized:
+                    return False
+                lines = [line.to_dict() for line in draft.lines.values()]
+                version = draft.version
+                draft.dirty = False
+            try:
+                saved = Bill.save_draft_items(draft.bill_id, lines, draft.saved_version, version)
+            except Exception:
+                db.session.rollback()
+                draft.dirty = True
+                raise
+            if saved:
+                draft.saved_version = version
+                product_index.touch(draft.store_id)
+        with self._lock:
+            if saved:
+                self.writebacks += 1
+                return True
+            # Finalized or saved by another process: this copy is stale
+            self.conflicts += 1
+            if self._drafts.get(draft.bill_id) is draft:
+                del self._drafts[draft.bill_id]
+        self._resync(draft.bill_id)
+        return False
+
+    def _resync(self, bill_id):
+        """Sends the bill's room the saved state of a draft whose copy here lost a save."""
+        fresh = load_draft(bill_id)
+        if fresh is None:
+            socket.emit('bill_error', {
+                'bill_id': bill_id,
+                'message': "This bill was finalized elsewhere; its unsaved edits were dropped.",
+            }, to=bill_room(bill_id))
+            return
+        with self._lock:
+            fresh = self._drafts.setdefault(bill_id, fresh)
+        socket.emit('bill_state', fresh.snapshot(), to=bill_room(bill_id))
+
+    def save_dirty(self):
+        """Persists every draft changed since the last save. Returns how many were written."""
+        with self._lock:
+            drafts = list(self._drafts.values())
+        return sum(1 for draft in drafts if self.save(draft))
+
+    def evict_expired(self):
+        """Writes back and drops drafts idle for longer than ttl."""
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [bill_id for bill_id, draft in self._drafts.items() if draft.last_access < cutoff]
+            evicted = [self._drafts.pop(bill_id) for bill_id in expired]
+            self.expirations += len(evicted)
+        self._write_back(evicted)
+        return len(evicted)
+
+    def discard(self, bill_id):
+        """Drops a draft without saving it, e.g. once it has been finalized."""
+        with self._lock:
+            return self._drafts.pop(bill_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._drafts),
+                'bytes': sum(draft.size_estimate() for draft in self._drafts.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'writebacks': self.writebacks,
+                'conflicts': self.conflicts,
+            }
+
+drafts = DraftCache(
+    max_entries=int(os.getenv('DRAFT_CACHE_MAX_ENTRIES', 1000)),
+    ttl=float(os.getenv('DRAFT_CACHE_TTL', 1800)),
+    max_bytes=int(os.getenv('DRAFT_CACHE_MAX_BYTES', 8 * 1024 * 1024)),
+)
@@ -0,0 +1,157 @@
+# mainSite/bill_totals.py
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+# All amounts are worked out in integer paise so sums are exact. Prices
+# are MRP based, so a line's net amount already includes GST:
+#   gross    = mrp * quantity
+#   discount = gross * discount_percent / 100
+#   net      = gross - discount               (what the customer pays)
+#   taxable  = net * 100 / (100 + gst_percent)
+#   gst      = net - taxable, split into CGST (rounded up) and SGST halves
+
+def _round_half_up(value):
+    return int(value + 0.5) if value >= 0 else -int(-value + 0.5)
+
+def line_amounts(mrp, quantity, discount_percent=0.0, gst_percent=0.0):
+    """Returns (gross, discount, taxable, cgst, sgst) for one line, in paise."""
+    gross = _round_half_up(mrp * 100) * quantity
+    discount = _round_half_up(gross * discount_percent / 100)
+    net = gross - discount
+    taxable = _round_half_up(net * 100 / (100 + gst_percent))
+    tax = net - taxable
+    cgst = (tax + 1) // 2
+    return gross, discount, taxable, cgst, tax - cgst
+
+def line_total(mrp, quantity, discount_percent=0.0):
+    """The GST-inclusive amount of a line in rupees, as stored in BillItem.total_price."""
+    gross, discount, _, _, _ = line_amounts(mrp, quantity, discount_percent)
+    return (gross - discount) / 100
+
+def gst_split(total_price, gst_percent):
+    """Splits a stored GST-inclusive line total into (taxable, cgst, sgst) rupees."""
+    net = _round_half_up(total_price * 100)
+    taxable = _round_half_up(net * 100 / (100 + gst_percent))
+    tax = net - taxable
+    cgst = (tax + 1) // 2
+    return taxable / 100, cgst / 100, (tax - cgst) / 100
+
+def _columns_numpy(quantity, mrp, discount_percent, gst_percent):
+    quantity = np.asarray(quantity, dtype=np.int64)
+    mrp = np.asarray(mrp, dtype=np.float64)
+    discount_percent = np.asarray(discount_percent, dtype=np.float64)
+    gst_percent = np.asarray(gst_percent, dtype=np.float64)
+    gross = np.floor(mrp * 100 + 0.5).astype(np.int64) * quantity
+    discount = np.floor(gross * discount_percent / 100 + 0.5).astype(np.int64)
+    net = gross - discount
+    taxable = np.floor(net * 100 / (100 + gst_percent) + 0.5).astype(np.int64)
+    tax = net - taxable
+    cgst = (tax + 1) // 2
+    return gross, discount, taxable, cgst, tax - cgst, gst_percent
+
+def _columns_python(quantity, mrp, discount_percent, gst_percent):
+    columns = tuple(array('q') for _ in range(5))
+    gross_col, discount_col, taxable_col, cgst_col, sgst_col = columns
+    for amounts in map(line_amounts, mrp, quantity, discount_percent, gst_percent):
+        gross_col.append(amounts[0])
+        discount_col.append(amounts[1])
+        taxable_col.append(amounts[2])
+        cgst_col.append(amounts[3])
+        sgst_col.append(amounts[4])
+    return columns + (array('d', gst_percent),)
+
+def _summary(gross, discount, taxable, cgst, sgst, slabs):
+    total_gst = cgst + sgst
+    return {
+        'subtotal': gross / 100,
+        'discount': discount / 100,
+        'taxable_value': taxable / 100,
+        'cgst': cgst / 100,
+        'sgst': sgst / 100,
+        'total_gst': total_gst / 100,
+        'grand_total': (taxable + total_gst) / 100,
+        'slabs': {
+            _slab_key(rate): {'taxable_value': t / 100, 'cgst': c / 100, 'sgst': s / 100}
+            for rate, (t, c, s) in sorted(slabs.items())
+        },
+    }
+
+def _slab_key(rate):
+    return int(rate) if float(rate).is_integer() else float(rate)
+
+def _group_numpy(columns, bill_ids):
+    gross, discount, taxable, cgst, sgst, rates = columns
+    bills, bill_index = np.unique(np.asarray(bill_ids), return_inverse=True)
+    slab_rates, slab_index = np.unique(rates, return_inverse=True)
+    n_bills, n_slabs = len(bills), len(slab_rates)
+    # One bincount per column over (bill, slab) cells does the whole grouping
+    cell = bill_index * n_slabs + slab_index
+    sums = [np.bincount(cell, weights=col, minlength=n_bills * n_slabs).round().astype(np.int64)
+            .reshape(n_bills, n_slabs) for col in (gross, discount, taxable, cgst, sgst)]
+    # A bill has a slab when it has lines at that rate, even ones that come to 0
+    line_counts = np.bincount(cell, minlength=n_bills * n_slabs).reshape(n_bills, n_slabs).tolist()
+    # Building the result dicts is plain Python, so hand it Python ints
+    totals = np.stack([col.sum(axis=1) for col in sums], axis=1).tolist()
+    taxable_cells, cgst_cells, sgst_cells = (sums[k].tolist() for k in (2, 3, 4))
+    slab_rates = slab_rates.tolist()
+    results = {}
+    for b, bill_id in enumerate(bills.tolist()):
+        slabs = {
+            slab_rates[s]: (taxable_cells[b][s], cgst_cells[b][s], sgst_cells[b][s])
+            for s in range(n_slabs) if line_counts[b][s]
+        }
+        results[bill_id] = _summary(*totals[b], slabs)
+    return results
+
+def _group_python(columns, bill_ids):
+    gross, discount, taxable, cgst, sgst, rates = columns
+    cells = {}
+    for i, bill_id in enumerate(bill_ids):
+        key = (bill_id, rates[i])
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells[key] = [0, 0, 0, 0, 0]
+        cell[0] += gross[i]
+        cell[1] += discount[i]
+        cell[2] += taxable[i]
+        cell[3] += cgst[i]
+        cell[4] += sgst[i]
+    per_bill = {}
+    for (bill_id, rate), cell in cells.items():
+        per_bill.setdefault(bill_id, {})[rate] = cell
+    results = {}
+    for bill_id, slabs in per_bill.items():
+        totals = [sum(cell[k] for cell in slabs.values()) for k in range(5)]
+        results[bill_id] = _summary(*totals, {rate: tuple(cell[2:]) for rate, cell in slabs.items()})
+    return results
+
+def compute_totals(quantity, mrp, discount_percent, gst_percent, bill_ids=None, use_numpy=None):
+    """
+    Works out bill totals from columnar line data: equal length sequences
+    (lists, array.array or numpy arrays) of quantity, mrp, discount and GST
+    percent. Returns subtotal, discount, taxable value, CGST/SGST, grand
+    total and a per-GST-slab breakdown, in rupees rounded to paise.
+
+    With bill_ids (one per line) the lines are grouped and a dict of
+    bill_id -> totals is returned instead. numpy is used when installed
+    unless use_numpy is False; otherwise the array module fallback runs.
+    """
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        columns = _columns_numpy(quantity, mrp, discount_percent, gst_percent)
+    else:
+        columns = _columns_python(quantity, mrp, discount_percent, gst_percent)
+    if bill_ids is not None:
+        return _group_numpy(columns, bill_ids) if use_numpy else _group_python(columns, bill_ids)
+    # A single bill is just one group
+    if use_numpy:
+        grouped = _group_numpy(columns, np.zeros(len(columns[0]), dtype=np.int64))
+    else:
+        grouped = _group_python(columns, [0] * len(columns[0]))
+    return grouped.get(0) or _summary(0, 0, 0, 0, 0, {})
@@ -0,0 +1,112 @@
+# mainSite/commands.py
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from .extensions import socket
+from .models import Store, SalesRollup
+from .product_import import import_products, CHUNK_SIZE
+from . import stock_alerts
+from .routes.sockets import push_stock_alerts
+from .jobs import JobWorker, TASKS, QUEUE_LIMITS
+from .tasks import scan_stock_alerts_job, rebuild_sales_rollups_job
+
+@click.command('check-product-counts')
+@click.option('--repair', is_flag=True, help='Rewrite drifted counters with the recomputed value.')
+@with_appcontext
+def check_product_counts(repair):
+    """Compare each store's product_count with the real number of products."""
+    drifted = Store.check_product_counts(repair=repair)
+    if not drifted:
+        click.echo('All store product counts are consistent.')
+        return
+    for store_id, stored, actual in drifted:
+        click.echo(f'Store {store_id}: stored {stored}, actual {actual}')
+    if repair:
+        click.echo(f'Repaired {len(drifted)} store(s).')
+    else:
+        click.echo(f'{len(drifted)} store(s) drifted. Run again with --repair to fix them.')
+
+@click.command('import-products')
+@click.argument('store_id', type=int)
+@click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True, help='Rows inserted per transaction.')
+@with_appcontext
+def import_products_command(store_id, csv_file, chunk_size):
+    """Import products for a store from a CSV file."""
+    if Store.query.get(store_id) is None:
+        raise click.ClickException(f'Store {store_id} does not exist.')
+    result = import_products(store_id, csv_file, chunk_size=chunk_size)
+    click.echo(f'Inserted {result.inserted} product(s), {result.failed} row(s) failed.')
+    for error in result.errors:
+        click.echo(f"  row {error['row']}: {error['error']}")
+
+@click.command('rebuild-sales-rollups')
+@click.option('--store-id', type=int, help='Rebuild one store instead of all of them.')
+@click.option('--enqueue', is_flag=True, help='Queue the rebuild for a jobs worker instead of running it here.')
+@with_appcontext
+def rebuild_sales_rollups(store_id, enqueue):
+    """Recompute the daily sales rollups from finalized bills."""
+    if store_id is not None and Store.query.get(store_id) is None:
+        raise click.ClickException(f'Store {store_id} does not exist.')
+    if enqueue:
+        job_id = rebuild_sales_rollups_job.enqueue({'store_id': store_id}, dedupe_key=f'rollups:{store_id or "all"}')
+        click.echo(f'Queued job {job_id}.')
+        return
+    written = SalesRollup.rebuild(store_id)
+    click.echo(f'Wrote {written} rollup row(s).')
+
+@click.command('scan-stock-alerts')
+@click.option('--days', default=stock_alerts.EXPIRY_DAYS, show_default=True, help='Flag batches expiring within this many days.')
+@click.option('--low-stock', default=stock_alerts.LOW_STOCK, show_default=True, help='Flag products with at most this many units.')
+@click.option('--batch-size', default=stock_alerts.STORE_BATCH_SIZE, show_default=True, help='Stores scanned per query.')
+@click.option('--notify/--no-notify', default=True, help='Push the alerts to each store\'s SocketIO room.')
+@click.option('--enqueue', is_flag=True, help='Queue the scan for a jobs worker (which always notifies) instead.')
+@with_appcontext
+def scan_stock_alerts(days, low_stock, batch_size, notify, enqueue):
+    """Find near-expiry and low-stock products across all stores."""
+    if enqueue:
+        job_id = scan_stock_alerts_job.enqueue({'days': days, 'low_stock': low_stock}, dedupe_key='alerts:all')
+        click.echo(f'Queued job {job_id}.')
+        return
+
+    def report(results):
+        for store_id, alerts in results.items():
+            click.echo(f"Store {store_id}: {len(alerts['expiring'])} expiring, {len(alerts['low_stock'])} low stock")
+        if notify:
+            push_stock_alerts(results)
+
+    scanned, alerted = stock_alerts.scan_all(days, low_stock, batch_size, on_batch=report)
+    click.echo(f'Scanned {scanned} store(s), {alerted} with alerts.')
+
+@click.command('jobs-worker')
+@click.option('--threads', default=4, show_default=True, help='Jobs run at once by this process.')
+@click.option('--queue', 'queues', multiple=True, help='Queue to serve; repeat for several. Default: every task\'s queue.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds to wait when no job is due.')
+@click.option('--no-message-queue', is_flag=True, help='Run without SOCKETIO_MESSAGE_QUEUE; emitted progress and alerts reach no client.')
+@with_appcontext
+def jobs_worker(threads, queues, poll_interval, no_message_queue):
+    """Run queued background jobs until interrupted.
+
+    Progress and alerts reach SocketIO clients, which are connected to the
+    web processes, only through SOCKETIO_MESSAGE_QUEUE, so the worker
+    refuses to start without it unless --no-message-queue is given. Limits
+    on how many jobs of a queue run at once across all workers come from
+    JOBS_QUEUE_LIMITS.
+    """
+    if not socket.server_options.get('message_queue'):
+        problem = "SOCKETIO_MESSAGE_QUEUE is not set, so job progress and alerts emitted here reach no client."
+        if not no_message_queue:
+            raise click.ClickException(f"{problem} Set it to the web processes' message queue, or pass --no-message-queue.")
+        click.secho(f"Warning: {problem}", fg='yellow', err=True)
+    queues = list(queues) or sorted({task.queue for task in TASKS.values()})
+    limits = ', '.join(f'{name}={QUEUE_LIMITS[name]}' for name in queues if name in QUEUE_LIMITS) or 'none'
+    click.echo(f"Serving {', '.join(queues)} with {threads} thread(s); queue limits: {limits}.")
+    JobWorker(current_app._get_current_object(), queues, threads=threads, poll_interval=poll_interval).run()
+
+def register_commands(app):
+    app.cli.add_command(check_product_counts)
+    app.cli.add_command(import_products_command)
+    app.cli.add_command(rebuild_sales_rollups)
+    app.cli.add_command(scan_stock_alerts)
+    app.cli.add_command(jobs_worker)
@@ -0,0 +1,116 @@
+# mainSite/exports.py
+
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from .extensions import db
+from .models import Product, Bill, BillItem
+from .bill_totals import gst_split
+
+YIELD_PER = 1000
+
+BILL_ITEM_COLUMNS = (
+    'bill_id', 'billing_date', 'customer_name', 'doctor_name', 'item_id', 'product_id',
+    'product_name', 'batch', 'quantity', 'discount_percent', 'gst_percent',
+    'taxable_value', 'cgst', 'sgst', 'total_price',
+)
+
+PRODUCT_COLUMNS = (
+    'id', 'name', 'batch', 'expire', 'mrp', 'gst_percent', 'quantity', 'quantity_unit',
+    'default_pack_size', 'created_at',
+)
+
+def parse_date_range(start, end):
+    """
+    Turns optional YYYY-MM-DD strings into a half-open datetime range; end
+    is inclusive of the whole day. Raises ValueError on a bad date.
+    """
+    start_at = datetime.fromisoformat(start) if start else None
+    end_before = datetime.fromisoformat(end) + timedelta(days=1) if end else None
+    return start_at, end_before
+
+def _stream(statement):
+    # yield_per fetches in batches and, where the driver supports it,
+    # uses a server-side cursor, so rows are never all held at once.
+    return db.session.execute(statement.execution_options(yield_per=YIELD_PER))
+
+def bill_item_rows(store_id, start_at=None, end_before=None):
+    """Yields one dict per bill line for a store, oldest bill first."""
+    statement = (
+        select(
+            Bill.id, Bill.billing_date, Bill.customer_name, Bill.doctor_name, BillItem.id,
+            BillItem.product_id, Product.name, Product.batch, BillItem.quantity,
+            BillItem.discount_percent, BillItem.gst_percent, BillItem.total_price,
+        )
+        .join(BillItem, BillItem.bill_id == Bill.id)
+        .join(Product, Product.id == BillItem.product_id)
+        .where(Bill.store_id == store_id, Bill.status == 'final')
+        .order_by(Bill.billing_date, Bill.id, BillItem.id)
+    )
+    if start_at:
+        statement = statement.where(Bill.billing_date >= start_at)
+    if end_before:
+        statement = statement.where(Bill.billing_date < end_before)
+    for (bill_id, billing_date, customer, doctor, item_id, product_id, name, batch,
+         quantity, discount, gst_percent, total_price) in _stream(statement):
+        taxable, cgst, sgst = gst_split(total_price, gst_percent)
+        yield {
+            'bill_id': bill_id,
+            'billing_date': billing_date.isoformat(),
+            'customer_name': customer,
+            'doctor_name': doctor,
+            'item_id': item_id,
+            'product_id': product_id,
+            'product_name': name,
+            'batch': batch,
+            'quantity': quantity,
+            'discount_percent': discount,
+            'gst_percent': gst_percent,
+            'taxable_value': taxable,
+            'cgst': cgst,
+            'sgst': sgst,
+            'total_price': total_price,
+        }
+
+def product_rows(store_id):
+    """Yields one dict per product of a store."""
+    statement = (
+        select(*(getattr(Product, column) for column in PRODUCT_COLUMNS))
+        .where(Product.store_id == store_id)
+        .order_by(Product.id)
+    )
+    for row in _stream(statement):
+        data = dict(zip(PRODUCT_COLUMNS, row))
+        for key in ('expire', 'created_at'):
+            if data[key]:
+                data[key] = data[key].isoformat()
+        yield data
+
+def iter_csv(rows, columns):
+    """Encodes dict rows as CSV text, one line per yielded chunk."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for row in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+def iter_ndjson(rows):
+    """Encodes dict rows as newline delimited JSON."""
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+def encode_rows(rows, columns, export_format):
+    if export_format == 'csv':
+        return iter_csv(rows, columns)
+    return iter_ndjson(rows)
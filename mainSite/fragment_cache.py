@@ -0,0 +1,89 @@
+# mainSite/fragment_cache.py
+
+import os
+import threading
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+class FragmentCache(object):
+    """
+    Per-process LRU cache of rendered template fragments, bounded both by
+    entry count and by the total length of the cached HTML.
+
+    Keys are tuples whose second item is a store id, as written by the
+    {% cache %} tag: {% cache 'store_card', store.id, store.version %}.
+    Putting the store's version in the key means a fragment stops being
+    used as soon as the store changes, in every worker process; the
+    explicit invalidate_store calls from the models just free the space
+    in this one.
+    """
+    def __init__(self, max_entries=5000, max_bytes=8 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> rendered Markup
+        self._fragments = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render):
+        """Returns the fragment cached under key, rendering and caching it on a miss."""
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+        fragment = render()
+        if self.max_entries and len(fragment) <= self.max_bytes:
+            with self._lock:
+                previous = self._fragments.pop(key, None)
+                if previous is not None:
+                    self._size -= len(previous)
+                self._fragments[key] = fragment
+                self._size += len(fragment)
+                while len(self._fragments) > self.max_entries or self._size > self.max_bytes:
+                    _, evicted = self._fragments.popitem(last=False)
+                    self._size -= len(evicted)
+        return fragment
+
+    def invalidate_store(self, store_id):
+        """Drops every fragment rendered for a store."""
+        with self._lock:
+            for key in [key for key in self._fragments if len(key) > 1 and key[1] == store_id]:
+                self._size -= len(self._fragments.pop(key))
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._fragments), 'bytes': self._size, 'hits': self.hits, 'misses': self.misses}
+
+fragments = FragmentCache(
+    max_entries=int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES', 5000)),
+    max_bytes=int(os.getenv('FRAGMENT_CACHE_MAX_BYTES', 8 * 1024 * 1024)),
+)
+
+class FragmentCacheExtension(Extension):
+    """
+    Adds {% cache name, *key %} ... {% endcache %} to templates. The block is
+    rendered once per distinct (name, *key) and then served from fragments.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cached', [nodes.Tuple(key, 'load')]), [], [], body).set_lineno(lineno)
+
+    def _cached(self, key, caller):
+        return fragments.get_or_render(key, caller)
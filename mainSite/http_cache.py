@@ -0,0 +1,73 @@
+# mainSite/http_cache.py
+
+import hashlib
+import os
+from datetime import timezone
+from flask import Response, request
+from .extensions import db
+from .models import Store
+
+# Part of every ETag; change it on a deploy that changes what a page or
+# payload looks like, so browsers don't keep the old one on a 304
+ETAG_SALT = os.getenv('HTTP_CACHE_ETAG_SALT', '')
+
+def make_etag(*parts):
+    """A short opaque tag for whatever state the parts describe."""
+    return hashlib.sha1('|'.join(map(str, (ETAG_SALT,) + parts)).encode()).hexdigest()[:20]
+
+def _utc(moment):
+    # Columns hold naive UTC; HTTP dates have whole seconds
+    return moment.replace(tzinfo=timezone.utc, microsecond=0) if moment else None
+
+def not_modified(etag, last_modified=None):
+    """
+    A 304 response when the request's If-None-Match (or, without one,
+    If-Modified-Since) still matches, so the caller can return before
+    loading or serializing anything more. Otherwise None.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    if request.if_none_match:
+        matches = request.if_none_match.contains_weak(etag)
+    elif last_modified is not None and request.if_modified_since is not None:
+        matches = _utc(last_modified) <= request.if_modified_since
+    else:
+        return None
+    if not matches:
+        return None
+    return cacheable(Response(status=304), etag, last_modified)
+
+def cacheable(response, etag, last_modified=None):
+    """
+    Adds the validators to a per-user response. Browsers keep it but check
+    back every time (private, no-cache), which costs a 304 while nothing changed.
+    """
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+def store_list_validators(user_id):
+    """
+    (etag, last_modified) for a user's stores, from one aggregate query.
+    The count and highest id catch stores being added or deleted, the
+    summed versions catch product and bill changes in any of them.
+    """
+    count, max_id, versions, last_modified = db.session.query(
+        db.func.count(Store.id), db.func.max(Store.id), db.func.sum(Store.version),
+        db.func.max(db.func.coalesce(Store.updated_at, Store.created_at)),
+    ).filter(Store.user_id == user_id).one()
+    return make_etag('stores', user_id, count, max_id, versions or 0, last_modified), last_modified
+
+def store_validators(store, *parts):
+    """(etag, last_modified) for one store and its products and bills."""
+    last_modified = store.updated_at or store.created_at
+    return make_etag('store', store.id, store.version, last_modified, *parts), last_modified
+
+def bill_validators(bill):
+    """(etag, last_modified) for one bill and its lines."""
+    last_modified = bill.updated_at or bill.created_at
+    return make_etag('bill', bill.id, bill.status, last_modified), last_modified
@@ -0,0 +1,383 @@
+# mainSite/jobs.py
+
+import json
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from .extensions import db, socket
+
+JOBS_DB_PATH = os.getenv('JOBS_DB_PATH') or os.path.join(os.path.dirname(__file__), 'jobs.db')
+# Seconds a claimed job may go without reporting progress before another worker may retry it
+LEASE_SECONDS = float(os.getenv('JOBS_LEASE_SECONDS', 300))
+# Retry n waits about BACKOFF_BASE * 2 ** (n - 1) seconds, capped at BACKOFF_MAX
+BACKOFF_BASE = float(os.getenv('JOBS_BACKOFF_BASE', 5))
+BACKOFF_MAX = float(os.getenv('JOBS_BACKOFF_MAX', 900))
+# Finished and failed jobs are deleted after this many seconds
+KEEP_SECONDS = float(os.getenv('JOBS_KEEP_SECONDS', 86400))
+
+def parse_queue_limits(spec):
+    """Parses 'alerts=1,rollups=2' into {'alerts': 1, 'rollups': 2}."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, limit = item.partition('=')
+        limits[name.strip()] = int(limit)
+    return limits
+
+# How many jobs of a queue may run at once across all workers; unlisted queues are unlimited
+QUEUE_LIMITS = parse_queue_limits(os.getenv('JOBS_QUEUE_LIMITS', 'alerts=1,rollups=1'))
+
+def backoff_seconds(attempts):
+    """Delay before retry number `attempts`, with jitter so failed jobs don't retry in lockstep."""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+class Task(object):
+    """A registered job handler. Calling .enqueue(payload) queues a run of it."""
+    def __init__(self, name, func, queue, max_attempts):
+        self.name = name
+        self.func = func
+        self.queue = queue
+        self.max_attempts = max_attempts
+
+    def enqueue(self, payload=None, **kwargs):
+        return job_queue.enqueue(self.name, payload, queue=self.queue, max_attempts=self.max_attempts, **kwargs)
+
+    def __call__(self, job):
+        return self.func(job)
+
+# name -> Task
+TASKS = {}
+
+def task(name, queue='default', max_attempts=5):
+    """Registers func(job) as the handler for jobs called name."""
+    def decorator(func):
+        TASKS[name] = Task(name, func, queue, max_attempts)
+        return TASKS[name]
+    return decorator
+
+class Job(object):
+    """A claimed job, as handed to its task."""
+    def __init__(self, queue_store, row):
+        self._store = queue_store
+        self.id, self.queue, self.name, payload, self.room, self.attempts, self.max_attempts = row
+        self.payload = json.loads(payload) if payload else {}
+
+    def progress(self, done, total=None, message=None):
+        """Records progress, renews the job's lease and tells its room."""
+        progress = {'done': done, 'total': total, 'message': message}
+        self._store.touch(self, progress)
+        self.notify('running', **progress)
+
+    def notify(self, status, **data):
+        if self.room:
+            socket.emit('job_progress', {'job_id': self.id, 'name': self.name, 'status': status, **data}, to=self.room)
+
+class SQLiteJobQueue(object):
+    """
+    Durable job queue in a local SQLite file, shared by the web processes
+    that enqueue and the `flask jobs-worker` processes that run the jobs.
+    Connections are pooled and run in WAL mode like the token store's.
+
+    A job is claimed under SQLite's write lock, which is also where the
+    per-queue concurrency limit is checked, so two workers can't both
+    take the last slot. A claim is a lease: a worker that dies mid-job
+    stops renewing it and the job is retried once it runs out. At most
+    one queued or running job exists per dedupe_key.
+
+    Named leases in the same file let one of several processes run a
+    periodic task; see acquire_lease.
+    """
+    def __init__(self, path, pool_size=5):
+        self.path = path
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self.init_schema()
+
+    def _connect(self):
+        # isolation_level=None keeps every statement in autocommit mode
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                self._pool.put_nowait(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        """A write transaction that holds SQLite's write lock from the start."""
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def init_schema(self):
+        with self.connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue TEXT NOT NULL,
+                name TEXT NOT NULL,
+                payload TEXT,
+                dedupe_key TEXT,
+                room TEXT,
+                owner_id INTEGER,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_at REAL NOT NULL,
+                locked_until REAL,
+                progress TEXT,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (queue, status, run_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_finished_at ON jobs (finished_at)')
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_dedupe ON jobs (dedupe_key) "
+                "WHERE status IN ('queued', 'running')"
+            )
+            conn.execute('''CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            )''')
+
+    def enqueue(self, name, payload=None, queue='default', dedupe_key=None, room=None, owner_id=None,
+                delay=0, max_attempts=5):
+        """
+        Queues a job and returns its id. If a job with the same dedupe_key
+        is still queued or running, nothing is added and that job's id is
+        returned instead.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO jobs (queue, name, payload, dedupe_key, room, owner_id, max_attempts, run_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (dedupe_key) WHERE status IN ('queued', 'running') DO NOTHING",
+                (queue, name, json.dumps(payload) if payload is not None else None, dedupe_key, room, owner_id,
+                 max_attempts, now + delay, now)
+            )
+            if cur.rowcount:
+                return cur.lastrowid
+            return conn.execute(
+                "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN ('queued', 'running')", (dedupe_key,)
+            ).fetchone()[0]
+
+    def claim(self, queue, limit=None, lease=LEASE_SECONDS):
+        """
+        Takes the next due job of queue, or returns None if there is none or
+        limit jobs of the queue are already running. Jobs whose lease ran out
+        are taken again, or failed if that was their last attempt.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            if limit is not None:
+                running = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE queue = ? AND status = 'running' AND locked_until > ?", (queue, now)
+                ).fetchone()[0]
+                if running >= limit:
+                    return None
+            while True:
+                row = conn.execute(
+                    "SELECT id, queue, name, payload, room, attempts, max_attempts FROM jobs "
+                    "WHERE queue = ? AND ((status = 'queued' AND run_at <= ?) OR (status = 'running' AND locked_until <= ?)) "
+                    "ORDER BY run_at, id LIMIT 1", (queue, now, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[5] >= row[6]:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', locked_until = NULL, finished_at = ?, "
+                        "last_error = COALESCE(last_error, 'Lease expired.') WHERE id = ?", (now, row[0])
+                    )
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ? WHERE id = ?",
+                    (now + lease, row[0])
+                )
+                return Job(self, row[:5] + (row[5] + 1, row[6]))
+
+    # touch, complete and fail only act on the attempt the job was claimed for,
+    # so a worker that lost its lease can't overwrite the retry that replaced it
+    def touch(self, job, progress=None, lease=LEASE_SECONDS):
+        """Renews a running job's lease and records its progress."""
+        with self.connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET locked_until = ?, progress = COALESCE(?, progress) "
+                "WHERE id = ? AND status = 'running' AND attempts = ?",
+                (time.time() + lease, json.dumps(progress) if progress is not None else None, job.id, job.attempts)
+            )
+
+    def complete(self, job):
+        with self.connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', locked_until = NULL, finished_at = ? "
+                "WHERE id = ? AND status = 'running' AND attempts = ?", (time.time(), job.id, job.attempts)
+            )
+
+    def fail(self, job, error, retry=True):
+        """
+        Records a failed attempt. The job is queued again after a backoff
+        while it has attempts left (and retry is True); returns the number
+        of seconds until then, or None once it has failed for good.
+        """
+        now = time.time()
+        with self.connection() as conn:
+            if retry and job.attempts < job.max_attempts:
+                delay = backoff_seconds(job.attempts)
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', locked_until = NULL, run_at = ?, last_error = ? "
+                    "WHERE id = ? AND status = 'running' AND attempts = ?", (now + delay, error, job.id, job.attempts)
+                )
+                return delay
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', locked_until = NULL, finished_at = ?, last_error = ? "
+                "WHERE id = ? AND status = 'running' AND attempts = ?", (now, error, job.id, job.attempts)
+            )
+            return None
+
+    def get(self, job_id):
+        """The job's state as a dict, or None."""
+        with self.connection() as conn:
+            cur = conn.execute(
+                "SELECT id, queue, name, status, attempts, max_attempts, progress, last_error, owner_id, room, "
+                "created_at, finished_at FROM jobs WHERE id = ?", (job_id,)
+            )
+            row = cur.fetchone()
+            if row is None:
+                return None
+            job = dict(zip((column[0] for column in cur.description), row))
+        job['progress'] = json.loads(job['progress']) if job['progress'] else None
+        return job
+
+    def counts(self):
+        """Jobs per (queue, status), for monitoring."""
+        with self.connection() as conn:
+            return {(q, status): count for q, status, count in conn.execute(
+                "SELECT queue, status, COUNT(*) FROM jobs GROUP BY queue, status")}
+
+    def acquire_lease(self, name, seconds):
+        """
+        Takes the named lease for the next seconds unless it is still held,
+        and returns whether this call got it. Nothing releases a lease; it
+        just runs out.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            cur = conn.execute(
+                "INSERT INTO leases (name, expires_at) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET expires_at = excluded.expires_at WHERE leases.expires_at <= ?",
+                (name, now + seconds, now)
+            )
+            return cur.rowcount == 1
+
+    def purge_finished(self, older_than=KEEP_SECONDS):
+        """Deletes done and failed jobs that finished more than older_than seconds ago."""
+        with self.connection() as conn:
+            cur = conn.execute(
+                "DELETE FROM jobs WHERE finished_at < ? AND status IN ('done', 'failed')", (time.time() - older_than,)
+            )
+            return cur.rowcount
+
+def create_job_queue(backend='sqlite', path=None, **kwargs):
+    """Builds the configured job queue. Only 'sqlite' (a local file) exists so far."""
+    if backend == 'sqlite':
+        return SQLiteJobQueue(path or JOBS_DB_PATH, **kwargs)
+    raise ValueError(f"Unknown job queue backend: {backend}")
+
+job_queue = create_job_queue(os.getenv('JOBS_BACKEND', 'sqlite'), path=JOBS_DB_PATH)
+
+class JobWorker(object):
+    """
+    A pool of threads running jobs from the given queues inside app
+    contexts. Each thread takes the first due job it can claim, trying
+    the queues in a rotating order so a busy queue can't starve the rest.
+    """
+    def __init__(self, app, queues, threads=4, poll_interval=1.0, limits=None, store=None):
+        self.app = app
+        self.queues = list(queues)
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.limits = QUEUE_LIMITS if limits is None else limits
+        self.store = store or job_queue
+        self._stop = threading.Event()
+        self._turn = 0
+
+    def _claim(self):
+        start = self._turn = (self._turn + 1) % len(self.queues)
+        for i in range(len(self.queues)):
+            name = self.queues[(start + i) % len(self.queues)]
+            job = self.store.claim(name, limit=self.limits.get(name))
+            if job is not None:
+                return job
+        return None
+
+    def run_one(self, job):
+        handler = TASKS.get(job.name)
+        with self.app.app_context():
+            try:
+                if handler is None:
+                    raise LookupError(f"No task is registered as {job.name!r}.")
+                job.notify('running', attempt=job.attempts)
+                handler(job)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                retry_in = self.store.fail(job, error, retry=handler is not None)
+                self.app.logger.warning("Job %s (%s) attempt %d failed: %s", job.id, job.name, job.attempts, error)
+                job.notify('retrying' if retry_in is not None else 'failed', error=error, retry_in=retry_in)
+            else:
+                self.store.complete(job)
+                job.notify('done')
+            finally:
+                db.session.remove()
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+            except sqlite3.OperationalError as e:
+                # Usually a busy database; back off and claim again
+                self.app.logger.warning("Claiming a job failed: %s", e)
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+            else:
+                self.run_one(job)
+
+    def run(self, purge_interval=3600):
+        """Runs the pool until stop() is called or the process is interrupted."""
+        workers = [threading.Thread(target=self._work, name=f'jobs-worker-{i}', daemon=True) for i in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        try:
+            while not self._stop.wait(purge_interval):
+                self.store.purge_finished()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            for worker in workers:
+                worker.join()
+
+    def stop(self):
+        self._stop.set()
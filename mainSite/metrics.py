@@ -0,0 +1,183 @@
+# mainSite/metrics.py
+
+import hmac
+import os
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from functools import wraps
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Log statements that run this many times or more in one request
+N_PLUS_ONE_THRESHOLD = int(os.getenv('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+LOG_N_PLUS_ONE = os.getenv('METRICS_LOG_N_PLUS_ONE', '').lower() in ('1', 'true', 'yes')
+# /metrics wants "Authorization: Bearer <token>", and is not served at all without one
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+TOKEN_STORE_OPERATIONS = ('add_publish_token', 'consume_publish_token', 'store_otp', 'consume_otp', 'purge_expired')
+
+class Histogram(object):
+    """A Prometheus style histogram with fixed buckets, one series per label set."""
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels tuple -> [per bucket counts (+Inf last), sum, count]
+        self._series = {}
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+request_seconds = Histogram(
+    'http_request_duration_seconds', 'Time spent serving a request.',
+    ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+request_queries = Histogram(
+    'http_request_sql_queries', 'SQL statements executed per request.',
+    ('endpoint',), QUERY_COUNT_BUCKETS)
+request_sql_seconds = Histogram(
+    'http_request_sql_seconds', 'Time spent in SQL per request.',
+    ('endpoint',), LATENCY_BUCKETS)
+token_store_seconds = Histogram(
+    'token_store_operation_seconds', 'Time spent in token store calls (tokens.db).',
+    ('operation',), LATENCY_BUCKETS)
+HISTOGRAMS = (request_seconds, request_queries, request_sql_seconds, token_store_seconds)
+
+# name -> callable returning a dict of numbers, exported as gauges on scrape
+_stats_sources = {}
+
+def register_stats(name, stats):
+    """Exports the numbers in stats() as <name>_<key> gauges, e.g. a cache's hit counts."""
+    _stats_sources[name] = stats
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for source, stats in sorted(_stats_sources.items()):
+        for key, value in sorted(stats().items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {source}_{key} gauge")
+                lines.append(f"{source}_{key} {value}")
+    return '\n'.join(lines) + '\n'
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+def _caller():
+    """The innermost frame in this app's code outside this module, for N+1 logs."""
+    here = os.path.dirname(__file__)
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        if frame.filename.startswith(here) and frame.filename != __file__:
+            return f"{os.path.relpath(frame.filename, os.path.dirname(here))}:{frame.lineno} in {frame.name}"
+    return 'unknown'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, 'metrics_started', None)
+    if started is None or not has_request_context() or 'metrics_started' not in g:
+        return
+    g.sql_seconds += time.perf_counter() - started
+    g.sql_queries += 1
+    if LOG_N_PLUS_ONE:
+        seen = g.sql_statements.get(statement, 0) + 1
+        g.sql_statements[statement] = seen
+        if seen == N_PLUS_ONE_THRESHOLD:
+            current_app.logger.warning(
+                "Possible N+1 in %s: statement ran %d times from %s: %s",
+                _endpoint(), seen, _caller(), ' '.join(statement.split())[:300])
+
+def _timed_call(operation, func):
+    @wraps(func)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            token_store_seconds.observe((operation,), elapsed)
+            if has_request_context() and 'metrics_started' in g:
+                g.token_store_seconds += elapsed
+    return timed
+
+def instrument_token_store(store):
+    """Times the token store's calls into its SQLite file (or memory) per operation."""
+    for operation in TOKEN_STORE_OPERATIONS:
+        setattr(store, operation, _timed_call(operation, getattr(store, operation)))
+    return store
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_seconds = 0.0
+    g.token_store_seconds = 0.0
+    g.sql_statements = {}
+
+def _finish_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = _endpoint()
+    request_seconds.observe((endpoint, request.method, str(response.status_code)), elapsed)
+    request_queries.observe((endpoint,), g.sql_queries)
+    request_sql_seconds.observe((endpoint,), g.sql_seconds)
+    timings = [
+        f'app;dur={elapsed * 1000:.1f}',
+        f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_queries} queries"',
+    ]
+    if g.token_store_seconds:
+        timings.append(f'tokens;dur={g.token_store_seconds * 1000:.1f}')
+    response.headers.add('Server-Timing', ', '.join(timings))
+    return response
+
+def metrics_view():
+    # Traffic, SQL timings and cache stats are internal, so there is no open default
+    if not METRICS_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+def init_app(app):
+    """Times every request and serves the collected metrics at /metrics to holders of METRICS_TOKEN."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
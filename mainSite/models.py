@@ -1,8 +1,13 @@
 from datetime import datetime
 from sqlalchemy import or_
-from sqlalchemy import Index, func
+from sqlalchemy import Index, func, case, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from flask_login import UserMixin
 from .extensions import db
+from .search_index import product_index
+from .user_cache import user_cache
+from .fragment_cache import fragments
+from .bill_totals import compute_totals, line_total, gst_split
 
 # A helper class for timestamping, not strictly necessary but good practice
 class TimestampMixin(object):
@@ -82,6 +87,7 @@ class User(db.Model, UserMixin, TimestampMixin):
             for key, value in kwargs.items():
                 setattr(user, key, value)
             db.session.commit()
+            user_cache.invalidate(user_id)
             return user
         return None
 
@@ -93,10 +99,16 @@ class User(db.Model, UserMixin, TimestampMixin):
         user = cls.query.get(user_id)
         if user:
             # Cascading delete should handle this, but it's good to be explicit
+            store_ids = [store.id for store in user.stores]
+            SalesRollup.delete_for_stores(store_ids)
             for store in user.stores:
                 db.session.delete(store)
             db.session.delete(user)
             db.session.commit()
+            user_cache.invalidate(user_id)
+            for store_id in store_ids:
+                product_index.invalidate(store_id)
+                fragments.invalidate_store(store_id)
             return True
         return False
 
@@ -118,6 +130,10 @@ class Store(db.Model, TimestampMixin):
     addr = db.Column(db.String(200))
     gst_no = db.Column(db.String(50))
     owner = db.Column(db.String(150), nullable=False)
+    # Denormalized product counter, kept in step by Product.create_product/delete_product
+    product_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped whenever the store's products or bills change, for HTTP cache validators
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Foreign key to link a store to a user
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -125,6 +141,10 @@ class Store(db.Model, TimestampMixin):
     # Relationship to products and bills: a store can have multiple products and bills
     products = db.relationship('Product', backref='store', lazy=True, cascade="all, delete-orphan")
     bills = db.relationship('Bill', backref='store', lazy=True, cascade="all, delete-orphan")
+    __table_args__ = (
+        # Keyset pagination of a user's stores, newest first
+        Index('ix_stores_user_created', 'user_id', 'created_at', 'id'),
+    )
 
     def __repr__(self):
         return f"Store('{self.name}')"
@@ -133,7 +153,6 @@ class Store(db.Model, TimestampMixin):
         """
         Converts the Store object to a dictionary.
         """
-        total_products = db.session.query(func.count(Product.id)).filter(Product.store_id == self.id).scalar()
         return {
             'id': self.id,
             'name': self.name,
@@ -144,10 +163,59 @@ class Store(db.Model, TimestampMixin):
             'gst_no': self.gst_no,
             'owner': self.owner,
             'user_id': self.user_id,
-            'total_products': total_products,
+            'total_products': self.product_count or 0,
             **self.to_dict_timestamps()
         }
 
+    @classmethod
+    def adjust_product_count(cls, store_id, delta):
+        """
+        Adds delta to a store's product counter as a single UPDATE in the
+        current transaction, bumping its version with it. The caller is
+        responsible for committing.
+        """
+        db.session.query(cls).filter(cls.id == store_id).update(
+            {cls.product_count: cls.product_count + delta, cls.version: cls.version + 1}, synchronize_session=False
+        )
+
+    @classmethod
+    def bump_version(cls, store_id):
+        """
+        Marks a store's products or bills as changed, so ETags built from its
+        version stop matching. store_id may be a scalar subquery. Runs in the
+        current transaction; the caller is responsible for committing.
+        """
+        db.session.query(cls).filter(cls.id == store_id).update(
+            {cls.version: cls.version + 1}, synchronize_session=False
+        )
+
+    @classmethod
+    def check_product_counts(cls, repair=False):
+        """
+        Recomputes every store's product count and compares it with the stored
+        counter. Returns a list of (store_id, stored, actual) for stores that
+        drifted, and fixes them when repair is True.
+        """
+        actual_counts = (
+            db.session.query(Product.store_id, func.count(Product.id).label('actual'))
+            .group_by(Product.store_id)
+            .subquery()
+        )
+        actual = func.coalesce(actual_counts.c.actual, 0)
+        drifted = (
+            db.session.query(cls.id, cls.product_count, actual)
+            .outerjoin(actual_counts, actual_counts.c.store_id == cls.id)
+            .filter(cls.product_count != actual)
+            .all()
+        )
+        if repair and drifted:
+            for store_id, _, count in drifted:
+                db.session.query(cls).filter(cls.id == store_id).update(
+                    {cls.product_count: count}, synchronize_session=False
+                )
+            db.session.commit()
+        return [tuple(row) for row in drifted]
+
     @classmethod
     def get_total_products(cls):
         """
@@ -175,7 +243,10 @@ class Store(db.Model, TimestampMixin):
         if store:
             for key, value in kwargs.items():
                 setattr(store, key, value)
+            store.version = cls.version + 1
             db.session.commit()
+            product_index.touch(store_id)
+            fragments.invalidate_store(store_id)
             return store
         return None
 
@@ -186,8 +257,11 @@ class Store(db.Model, TimestampMixin):
         """
         store = cls.query.get(store_id)
         if store:
+            SalesRollup.delete_for_stores([store_id])
             db.session.delete(store)
             db.session.commit()
+            product_index.invalidate(store_id)
+            fragments.invalidate_store(store_id)
             return True
         return False
 
@@ -212,6 +286,10 @@ class Product(db.Model, TimestampMixin):
     store_id = db.Column(db.Integer, db.ForeignKey('stores.id'), nullable=False)
     __table_args__ = (
         Index('trgm_product_idx', name, batch, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops', 'batch': 'gin_trgm_ops'}),
+        Index('ix_products_store_created', 'store_id', 'created_at', 'id'),
+        # Range scans for the near-expiry and low-stock alerts
+        Index('ix_products_store_expire', 'store_id', 'expire'),
+        Index('ix_products_store_quantity', 'store_id', 'quantity'),
     )
     def __repr__(self):
         return f"Product('{self.name}', MRP: {self.mrp}')"
@@ -286,12 +364,15 @@ class Product(db.Model, TimestampMixin):
             gst_percent=gst_percent,
             mrp=mrp,
             quantity_unit=quantity_unit,
-            rate_unit=rate_unit,
             expire=expire,
             batch=batch
         )
         db.session.add(new_product)
+        # Counter update shares the insert's transaction
+        Store.adjust_product_count(store_id, 1)
         db.session.commit()
+        product_index.add_product(new_product)
+        fragments.invalidate_store(store_id)
         return new_product
 
     @classmethod
@@ -301,9 +382,19 @@ class Product(db.Model, TimestampMixin):
         """
         product = cls.query.get(product_id)
         if product:
+            old_store_id = product.store_id
             for key, value in kwargs.items():
                 setattr(product, key, value)
+            if product.store_id != old_store_id:
+                # Moving a product between stores shifts it between counters
+                Store.adjust_product_count(old_store_id, -1)
+                Store.adjust_product_count(product.store_id, 1)
+            else:
+                Store.bump_version(product.store_id)
             db.session.commit()
+            product_index.update_product(product, old_store_id=old_store_id)
+            fragments.invalidate_store(old_store_id)
+            fragments.invalidate_store(product.store_id)
             return product
         return None
 
@@ -315,10 +406,27 @@ class Product(db.Model, TimestampMixin):
         product = cls.query.get(product_id)
         if product:
             db.session.delete(product)
+            Store.adjust_product_count(product.store_id, -1)
             db.session.commit()
+            product_index.remove_product(product.store_id, product.id)
+            fragments.invalidate_store(product.store_id)
             return True
         return False
 
+class BillingError(ValueError):
+    """Raised when a bill can't be created from the given line items."""
+
+class InsufficientStockError(BillingError):
+    """Raised when a bill asks for more of a product than is in stock."""
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        super().__init__(f"Not enough stock for product(s): {', '.join(map(str, product_ids))}")
+
+class StaleDraftError(BillingError):
+    """Raised when a draft was finalized, or saved over, since the caller's copy of it was loaded."""
+    def __init__(self):
+        super().__init__("This bill was changed or finalized elsewhere. Reload it and try again.")
+
 # New models for billing functionality
 class Bill(db.Model, TimestampMixin):
     """
@@ -330,6 +438,10 @@ class Bill(db.Model, TimestampMixin):
     customer_name = db.Column(db.String(100))
     doctor_name = db.Column(db.String(100))
     billing_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # 'draft' while being edited at the counter, 'final' once stock is taken
+    status = db.Column(db.String(10), nullable=False, default='final', server_default='final')
+    # Version of the last saved draft edit; saves compare and swap on it
+    draft_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     # Store information at the time of billing to preserve it
     store_name = db.Column(db.String(100), nullable=False)
@@ -343,6 +455,12 @@ class Bill(db.Model, TimestampMixin):
     
     # A relationship to the BillItem table to get all products on this bill
     items = db.relationship('BillItem', backref='bill', lazy=True, cascade="all, delete-orphan")
+    __table_args__ = (
+        Index('ix_bills_store_created', 'store_id', 'created_at', 'id'),
+        # Date-range reports per store, and across stores
+        Index('ix_bills_store_billing_date', 'store_id', 'billing_date'),
+        Index('ix_bills_billing_date', 'billing_date'),
+    )
 
     def __repr__(self):
         return f"Bill(ID: {self.id}, Store: {self.store_name}, Date: {self.billing_date.strftime('%Y-%m-%d')})"
@@ -357,6 +475,7 @@ class Bill(db.Model, TimestampMixin):
             'customer_name': self.customer_name,
             'doctor_name': self.doctor_name,
             'billing_date': self.billing_date.isoformat(),
+            'status': self.status,
             'store_name': self.store_name,
             'owner_name': self.owner_name,
             'store_gst_no': self.store_gst_no,
@@ -366,6 +485,204 @@ class Bill(db.Model, TimestampMixin):
             **self.to_dict_timestamps()
         }
 
+    def totals(self):
+        """
+        Returns the bill's subtotal, discount, per-slab CGST/SGST and grand
+        total, computed from its line columns without loading BillItem objects.
+        """
+        rows = (
+            db.session.query(BillItem.quantity, BillItem.mrp, BillItem.discount_percent, BillItem.gst_percent)
+            .filter(BillItem.bill_id == self.id)
+            .all()
+        )
+        # Each line keeps the unit MRP it was billed at, so later price
+        # changes don't rewrite old bills
+        quantity = [row.quantity for row in rows]
+        mrp = [row.mrp for row in rows]
+        discount = [row.discount_percent for row in rows]
+        gst = [row.gst_percent for row in rows]
+        return compute_totals(quantity, mrp, discount, gst)
+
+    @staticmethod
+    def _parse_items(items):
+        """Validates raw line items and returns (product_id, quantity, discount_percent) tuples."""
+        if not items:
+            raise BillingError("A bill needs at least one item.")
+        lines = []
+        for item in items:
+            try:
+                product_id = int(item['product_id'])
+                quantity = int(item['quantity'])
+                discount = float(item.get('discount_percent') or 0)
+            except (KeyError, TypeError, ValueError):
+                raise BillingError("Each item needs a product_id and a whole number quantity.")
+            if quantity <= 0:
+                raise BillingError("Item quantities must be positive.")
+            if not 0 <= discount <= 100:
+                raise BillingError("Discounts must be between 0 and 100 percent.")
+            lines.append((product_id, quantity, discount))
+        return lines
+
+    @classmethod
+    def create_bill(cls, store, items, customer_name=None, doctor_name=None, billing_date=None, draft=None, draft_version=None):
+        """
+        Finalizes a bill for a store in a single transaction: snapshots the
+        store details into the bill, inserts every line with one executemany
+        and takes the stock with one guarded UPDATE. The day's sales rollups
+        are updated in the same transaction. If any product is short the
+        whole bill is rolled back and InsufficientStockError is raised.
+        items is a list of dicts with product_id, quantity and optionally
+        discount_percent. Pass a draft Bill to finalize it in place, replacing
+        its saved lines, and the draft_version the caller's copy was saved
+        at: the bill is claimed with a guarded UPDATE before any stock is
+        taken, and StaleDraftError is raised if it is no longer a draft at
+        that version. A draft's items also carry the mrp and gst_percent the
+        draft showed, which are billed instead of the product's current ones.
+        Returns the bill and the inserted line mappings.
+        """
+        lines = cls._parse_items(items)
+        needed = {}
+        for product_id, quantity, _ in lines:
+            needed[product_id] = needed.get(product_id, 0) + quantity
+
+        products = {
+            row.id: row for row in db.session.query(Product.id, Product.mrp, Product.gst_percent)
+            .filter(Product.id.in_(needed), Product.store_id == store.id)
+        }
+        missing = set(needed) - set(products)
+        if missing:
+            raise BillingError(f"Unknown product(s) for this store: {', '.join(map(str, sorted(missing)))}")
+        prices = {pid: (product.mrp, product.gst_percent) for pid, product in products.items()}
+        if draft is not None:
+            # The price a line was added to the draft at, even if the product changed since
+            prices.update((int(item['product_id']), (item['mrp'], item['gst_percent'])) for item in items)
+
+        if draft is not None:
+            # Only one finalize of a draft, from whichever process, can match
+            # this row; the others match nothing and take no stock
+            claimed = db.session.execute(
+                update(cls)
+                .where(cls.id == draft.id, cls.status == 'draft', cls.draft_version == draft_version)
+                .values(status='final')
+                .execution_options(synchronize_session=False)
+            )
+            if claimed.rowcount != 1:
+                db.session.rollback()
+                raise StaleDraftError()
+        bill = draft if draft is not None else cls(store_id=store.id)
+        bill.customer_name = customer_name
+        bill.doctor_name = doctor_name
+        bill.billing_date = billing_date or datetime.utcnow()
+        bill.status = 'final'
+        bill.store_name = store.name
+        bill.owner_name = store.owner
+        bill.store_gst_no = store.gst_no
+        bill.store_addr = store.addr
+        bill.store_phone = store.phone
+        try:
+            db.session.add(bill)
+            if draft is not None:
+                # The finalized lines replace whatever the draft last saved
+                db.session.query(BillItem).filter(BillItem.bill_id == bill.id).delete(synchronize_session=False)
+            db.session.flush()
+            # The quantity >= n guard runs inside the UPDATE, which locks each
+            # row it changes, so two bills racing for the last strips can't
+            # both succeed: the loser matches fewer rows than it asked for.
+            taken = case(needed, value=Product.id)
+            result = db.session.execute(
+                update(Product)
+                .where(Product.id.in_(needed), Product.store_id == store.id, Product.quantity >= taken)
+                .values(quantity=Product.quantity - taken)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount != len(needed):
+                db.session.rollback()
+                short = [
+                    row.id for row in db.session.query(Product.id, Product.quantity)
+                    .filter(Product.id.in_(needed)) if row.quantity < needed[row.id]
+                ]
+                raise InsufficientStockError(sorted(short))
+            rows = []
+            for product_id, quantity, discount in lines:
+                mrp, gst_percent = prices[product_id]
+                rows.append({
+                    'bill_id': bill.id,
+                    'product_id': product_id,
+                    'quantity': quantity,
+                    'mrp': mrp,
+                    'discount_percent': discount,
+                    'gst_percent': gst_percent,
+                    'total_price': line_total(mrp, quantity, discount),
+                })
+            db.session.execute(insert(BillItem), rows)
+            SalesRollup.add_bill_lines(store.id, bill.billing_date.date(), rows)
+            Store.bump_version(store.id)
+            db.session.commit()
+        except (InsufficientStockError, StaleDraftError):
+            raise
+        except Exception:
+            db.session.rollback()
+            raise
+        product_index.adjust_quantities(store.id, {pid: -qty for pid, qty in needed.items()})
+        fragments.invalidate_store(store.id)
+        return bill, rows
+
+    @classmethod
+    def create_draft(cls, store, customer_name=None, doctor_name=None):
+        """
+        Creates an empty draft bill to be edited live at the counter.
+        Stock is only taken when the draft is finalized with create_bill.
+        """
+        draft = cls(
+            store_id=store.id,
+            status='draft',
+            customer_name=customer_name,
+            doctor_name=doctor_name,
+            store_name=store.name,
+            owner_name=store.owner,
+            store_gst_no=store.gst_no,
+            store_addr=store.addr,
+            store_phone=store.phone,
+        )
+        db.session.add(draft)
+        Store.bump_version(store.id)
+        db.session.commit()
+        product_index.touch(store.id)
+        return draft
+
+    @classmethod
+    def save_draft_items(cls, bill_id, lines, base_version, version):
+        """
+        Replaces a draft's saved lines in one transaction. lines are dicts with
+        product_id, quantity, discount_percent, mrp and gst_percent. The save
+        only goes through while the bill's draft_version is still
+        base_version, the version the caller's copy was loaded or last saved
+        at, and sets it to version. Returns False without writing if the
+        bill is no longer a draft or another process saved it first.
+        """
+        # Touching the bill row first locks it against a concurrent finalize or save
+        touched = db.session.query(cls).filter(
+            cls.id == bill_id, cls.status == 'draft', cls.draft_version == base_version
+        ).update({cls.updated_at: datetime.utcnow(), cls.draft_version: version}, synchronize_session=False)
+        if not touched:
+            db.session.rollback()
+            return False
+        rows = [{
+            'bill_id': bill_id,
+            'product_id': line['product_id'],
+            'quantity': line['quantity'],
+            'mrp': line['mrp'],
+            'discount_percent': line['discount_percent'],
+            'gst_percent': line['gst_percent'],
+            'total_price': line_total(line['mrp'], line['quantity'], line['discount_percent']),
+        } for line in lines]
+        db.session.query(BillItem).filter(BillItem.bill_id == bill_id).delete(synchronize_session=False)
+        if rows:
+            db.session.execute(insert(BillItem), rows)
+        Store.bump_version(select(cls.store_id).where(cls.id == bill_id).scalar_subquery())
+        db.session.commit()
+        return True
+
 class BillItem(db.Model):
     """
     BillItem model, representing a single product line item on a bill.
@@ -375,6 +692,8 @@ class BillItem(db.Model):
     __tablename__ = 'bill_items'
     id = db.Column(db.Integer, primary_key=True)
     quantity = db.Column(db.Integer, nullable=False)
+    # Unit MRP at the time of billing
+    mrp = db.Column(db.Float, nullable=False)
     discount_percent = db.Column(db.Float, nullable=False, default=0.0)
     gst_percent = db.Column(db.Float, nullable=False, default=0.0)
     total_price = db.Column(db.Float, nullable=False)
@@ -385,6 +704,11 @@ class BillItem(db.Model):
     
     # Relationship to the product
     product = db.relationship('Product')
+    __table_args__ = (
+        # Loading a bill's items, and finding bills that reference a product
+        Index('ix_bill_items_bill', 'bill_id'),
+        Index('ix_bill_items_product', 'product_id'),
+    )
 
     def __repr__(self):
         return f"BillItem(Product ID: {self.product_id}, Quantity: {self.quantity})"
@@ -396,9 +720,124 @@ class BillItem(db.Model):
         return {
             'id': self.id,
             'quantity': self.quantity,
+            'mrp': self.mrp,
             'discount_percent': self.discount_percent,
             'gst_percent': self.gst_percent,
             'total_price': self.total_price,
             'bill_id': self.bill_id,
             'product_id': self.product_id
-        }
\ No newline at end of file
+        }
+
+# Daily sales rollups, so analytics never have to scan bills
+class SalesRollup(db.Model):
+    """
+    Units sold, revenue and GST collected per store, day and product, over
+    finalized bills. Amounts are kept in integer paise so incremental
+    additions never drift; they are updated by Bill.create_bill and can be
+    rebuilt from the bills with the rebuild-sales-rollups command.
+    """
+    __tablename__ = 'sales_rollups'
+    store_id = db.Column(db.Integer, db.ForeignKey('stores.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.BigInteger, nullable=False, default=0)
+    gst = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"SalesRollup(Store: {self.store_id}, Day: {self.day}, Product ID: {self.product_id})"
+
+    @staticmethod
+    def _accumulate(sums, day, product_id, quantity, gst_percent, total_price):
+        """Adds one bill line to sums, a dict of (day, product_id) -> [quantity, revenue, gst]."""
+        # The same paise split the bill exports use, so the two always agree
+        net = round(total_price * 100)
+        taxable = round(gst_split(total_price, gst_percent)[0] * 100)
+        entry = sums.get((day, product_id))
+        if entry is None:
+            entry = sums[(day, product_id)] = [0, 0, 0]
+        entry[0] += quantity
+        entry[1] += net
+        entry[2] += net - taxable
+
+    @staticmethod
+    def _rows(store_id, sums):
+        return [
+            {'store_id': store_id, 'day': day, 'product_id': product_id,
+             'quantity': quantity, 'revenue': revenue, 'gst': gst}
+            for (day, product_id), (quantity, revenue, gst) in sums.items()
+        ]
+
+    @classmethod
+    def add_bill_lines(cls, store_id, day, lines):
+        """
+        Adds a finalized bill's lines to the day's rollups in the current
+        transaction, one upsert per product. The caller commits.
+        """
+        sums = {}
+        for line in lines:
+            cls._accumulate(sums, day, line['product_id'], line['quantity'], line['gst_percent'], line['total_price'])
+        rows = cls._rows(store_id, sums)
+        if not rows:
+            return
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('sqlite', 'postgresql'):
+            stmt = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(cls)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[cls.store_id, cls.day, cls.product_id],
+                set_={
+                    'quantity': cls.quantity + stmt.excluded.quantity,
+                    'revenue': cls.revenue + stmt.excluded.revenue,
+                    'gst': cls.gst + stmt.excluded.gst,
+                },
+            )
+            db.session.execute(stmt, rows)
+            return
+        # No upsert on this backend: bump existing rows and insert the rest
+        for row in rows:
+            updated = db.session.query(cls).filter(
+                cls.store_id == row['store_id'], cls.day == row['day'], cls.product_id == row['product_id']
+            ).update({
+                cls.quantity: cls.quantity + row['quantity'],
+                cls.revenue: cls.revenue + row['revenue'],
+                cls.gst: cls.gst + row['gst'],
+            }, synchronize_session=False)
+            if not updated:
+                db.session.execute(insert(cls), [row])
+
+    @classmethod
+    def delete_for_stores(cls, store_ids):
+        """Deletes the rollups of the given stores in the current transaction."""
+        if store_ids:
+            db.session.query(cls).filter(cls.store_id.in_(store_ids)).delete(synchronize_session=False)
+
+    @classmethod
+    def rebuild(cls, store_id=None, yield_per=1000):
+        """
+        Recomputes rollups from finalized bills, for one store or all of
+        them, one store per transaction. Lines are streamed, so memory only
+        grows with the number of (day, product) pairs of a single store.
+        Returns the number of rollup rows written.
+        """
+        if store_id is None:
+            store_ids = [row.id for row in db.session.query(Store.id).order_by(Store.id)]
+        else:
+            store_ids = [store_id]
+        written = 0
+        for sid in store_ids:
+            lines = db.session.execute(
+                db.select(Bill.billing_date, BillItem.product_id, BillItem.quantity,
+                          BillItem.gst_percent, BillItem.total_price)
+                .join(BillItem, BillItem.bill_id == Bill.id)
+                .where(Bill.store_id == sid, Bill.status == 'final')
+                .execution_options(yield_per=yield_per)
+            )
+            sums = {}
+            for billing_date, product_id, quantity, gst_percent, total_price in lines:
+                cls._accumulate(sums, billing_date.date(), product_id, quantity, gst_percent, total_price)
+            cls.delete_for_stores([sid])
+            if sums:
+                db.session.execute(insert(cls), cls._rows(sid, sums))
+            db.session.commit()
+            written += len(sums)
+        return written
@@ -0,0 +1,46 @@
+# mainSite/pagination.py
+
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+
+def encode_cursor(created_at, row_id):
+    """Packs a (created_at, id) position into an opaque URL-safe string."""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Reverses encode_cursor. Raises ValueError for a malformed cursor."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor.")
+
+class KeysetPage(object):
+    """One page of keyset pagination results."""
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+def keyset_paginate(query, model, cursor=None, per_page=20):
+    """
+    Paginates query newest first on (created_at, id), continuing after the
+    row the cursor points at. Unlike OFFSET pagination every page is an
+    index range scan of per_page + 1 rows, with no COUNT query, so page
+    1000 costs the same as page 1. model must use TimestampMixin.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return KeysetPage(rows, next_cursor)
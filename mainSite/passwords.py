@@ -0,0 +1,80 @@
+# mainSite/passwords.py
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Any method werkzeug accepts, e.g. 'pbkdf2:sha256:600000' or 'scrypt:32768:8:1'
+HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+SALT_LENGTH = int(os.getenv('PASSWORD_SALT_LENGTH', 16))
+# Hashes computed at once, and how long a request waits for a free slot
+HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', min(4, os.cpu_count() or 1)))
+HASH_WAIT_SECONDS = float(os.getenv('PASSWORD_HASH_WAIT', 5))
+
+class HashingBusy(RuntimeError):
+    """Raised when no hashing slot frees up within HASH_WAIT_SECONDS."""
+
+def _method_prefix(hashed):
+    # 'pbkdf2:sha256:1000000$salt$hash' -> 'pbkdf2:sha256:1000000'
+    return hashed.split('$', 1)[0]
+
+class PasswordHasher(object):
+    """
+    Hashes and checks passwords off the request thread, on a small pool
+    of worker threads. A semaphore caps how many hashes run at once; a
+    request that can't get a slot in time gets HashingBusy rather than
+    queueing forever, so a burst of logins can't tie up every worker
+    that also serves pages and SocketIO.
+    """
+    def __init__(self, method=HASH_METHOD, salt_length=SALT_LENGTH,
+                 concurrency=HASH_CONCURRENCY, wait_seconds=HASH_WAIT_SECONDS):
+        self.method = method
+        self.salt_length = salt_length
+        self.wait_seconds = wait_seconds
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._offload = self._offloader(concurrency)
+        self._prefix = None
+
+    @staticmethod
+    def _offloader(concurrency):
+        # Under eventlet/gevent (see app.py) stdlib threads are green and would
+        # hash on the event loop, so use their pools of real OS threads instead.
+        async_mode = os.getenv('SOCKETIO_ASYNC_MODE')
+        if async_mode == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute
+        if async_mode == 'gevent':
+            import gevent
+            pool = gevent.get_hub().threadpool
+            return lambda func, *args: pool.apply(func, args)
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='password-hash')
+        return lambda func, *args: executor.submit(func, *args).result()
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise HashingBusy("Too many sign-ins at once, try again in a moment.")
+        try:
+            return self._offload(func, *args)
+        finally:
+            self._slots.release()
+
+    @property
+    def prefix(self):
+        """What werkzeug writes in front of a hash made with the current policy."""
+        if self._prefix is None:
+            # Worked out on first use rather than at import, which would cost a full hash
+            self._prefix = _method_prefix(self.hash(''))
+        return self._prefix
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, hashed, password):
+        """Returns (matches, needs_rehash) for a stored hash."""
+        if not hashed:
+            return False, False
+        matches = self._run(check_password_hash, hashed, password)
+        return matches, matches and _method_prefix(hashed) != self.prefix
+
+hasher = PasswordHasher()
@@ -0,0 +1,176 @@
+# mainSite/product_import.py
+
+import csv
+import math
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from .extensions import db
+from .models import Store, Product
+from .search_index import product_index
+from .fragment_cache import fragments
+
+IMPORT_COLUMNS = ('name', 'batch', 'expire', 'mrp', 'gst_percent', 'quantity', 'unit')
+CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+class ImportResult(object):
+    """
+    Outcome of a product import. Only the first max_errors row errors are
+    kept, so a file full of bad rows can't grow memory without bound.
+    """
+    def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.errors_truncated = False
+        self.max_errors = max_errors
+
+    def add_error(self, row_number, message):
+        self.failed += 1
+        self._report(row_number, message)
+
+    def add_rows_error(self, first_row, count, message):
+        """Records count valid rows, starting at first_row, that were rejected together."""
+        self.failed += count
+        self._report(first_row, message)
+
+    def _report(self, row_number, message):
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'error': message})
+        else:
+            self.errors_truncated = True
+
+    def to_dict(self):
+        return {
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.errors_truncated,
+        }
+
+def _parse_expire(value):
+    # Accepts full ISO dates as well as the YYYY-MM printed on medicine strips
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, '%Y-%m')
+
+def parse_row(row):
+    """
+    Validates one CSV row and returns the column mapping for the products
+    table. Raises ValueError with a readable message for a bad row.
+    """
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError("name is required")
+    if len(name) > 100:
+        raise ValueError("name is longer than 100 characters")
+    batch = (row.get('batch') or '').strip() or None
+    if batch and len(batch) > 12:
+        raise ValueError("batch is longer than 12 characters")
+    unit = (row.get('unit') or '').strip() or 'units'
+    if len(unit) > 20:
+        raise ValueError("unit is longer than 20 characters")
+    try:
+        mrp = float(row.get('mrp') or '')
+    except ValueError:
+        raise ValueError("mrp must be a number")
+    if not math.isfinite(mrp):
+        raise ValueError("mrp must be a finite number")
+    if mrp < 0:
+        raise ValueError("mrp can't be negative")
+    try:
+        gst_percent = int(row.get('gst_percent') or 0)
+    except ValueError:
+        raise ValueError("gst_percent must be a whole number")
+    if not 0 <= gst_percent <= 100:
+        raise ValueError("gst_percent must be between 0 and 100")
+    try:
+        quantity = int(row.get('quantity') or 0)
+    except ValueError:
+        raise ValueError("quantity must be a whole number")
+    if quantity < 0:
+        raise ValueError("quantity can't be negative")
+    expire = (row.get('expire') or '').strip()
+    try:
+        expire = _parse_expire(expire) if expire else None
+    except ValueError:
+        raise ValueError("expire must be a date like 2026-08-31 or 2026-08")
+    return {
+        'name': name,
+        'batch': batch,
+        'expire': expire,
+        'mrp': mrp,
+        'gst_percent': gst_percent,
+        'quantity': quantity,
+        'quantity_unit': unit,
+    }
+
+def _flush(store_id, chunk, result):
+    now = datetime.utcnow()
+    for mapping in chunk:
+        mapping['store_id'] = store_id
+        mapping['created_at'] = now
+    # One executemany per chunk, with the counter update in the same transaction
+    db.session.execute(insert(Product), chunk)
+    Store.adjust_product_count(store_id, len(chunk))
+    db.session.commit()
+    result.inserted += len(chunk)
+
+def import_products(store_id, text_stream, chunk_size=CHUNK_SIZE, max_errors=MAX_REPORTED_ERRORS):
+    """
+    Streams a CSV with the IMPORT_COLUMNS header into a store's products.
+    Rows are validated one at a time and inserted in chunks with a commit
+    per chunk, so memory use depends on chunk_size and not on the file size.
+    Bad rows are skipped and reported in the returned ImportResult. A
+    malformed or undecodable file, or a chunk the database rejects, stops
+    the import: chunks committed before it stay, and the rows that were
+    not saved are reported.
+    """
+    result = ImportResult(max_errors)
+    reader = csv.DictReader(text_stream)
+    chunk = []
+    chunk_rows = None
+    try:
+        missing = {'name', 'mrp'} - set(reader.fieldnames or ())
+        if missing:
+            result.add_error(1, f"missing required column(s): {', '.join(sorted(missing))}")
+            return result
+        # Row 1 is the header, so data rows start at 2 like in a spreadsheet
+        for row_number, row in enumerate(reader, start=2):
+            try:
+                mapping = parse_row(row)
+            except ValueError as e:
+                result.add_error(row_number, str(e))
+                continue
+            if not chunk:
+                chunk_rows = (row_number, row_number)
+            chunk.append(mapping)
+            chunk_rows = (chunk_rows[0], row_number)
+            if len(chunk) >= chunk_size:
+                _flush(store_id, chunk, result)
+                chunk = []
+        if chunk:
+            _flush(store_id, chunk, result)
+            chunk = []
+    except csv.Error as e:
+        db.session.rollback()
+        result.add_error(reader.line_num, f"malformed CSV: {e}")
+    except UnicodeDecodeError:
+        db.session.rollback()
+        result.add_error(reader.line_num + 1, "the file is not UTF-8 encoded text")
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        result.add_rows_error(chunk_rows[0], len(chunk),
+                              f"rows {chunk_rows[0]}-{chunk_rows[1]} could not be saved: {getattr(e, 'orig', None) or e}")
+        chunk = []
+    finally:
+        # The index is rebuilt lazily on the next search
+        product_index.invalidate(store_id)
+        fragments.invalidate_store(store_id)
+    if chunk:
+        # Valid rows read before the import stopped were never inserted
+        result.add_rows_error(chunk_rows[0], len(chunk),
+                              f"rows {chunk_rows[0]}-{chunk_rows[1]} were not imported because the import stopped")
+    return result
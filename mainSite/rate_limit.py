@@ -0,0 +1,164 @@
+# mainSite/rate_limit.py
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, has_request_context, request
+from flask_login import current_user
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+class RateLimited(Exception):
+    """Raised when a caller has used up a rate limit; retry_after is in seconds."""
+    def __init__(self, retry_after):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Too many requests. Try again in {self.retry_after} second(s).")
+
+class RateLimit(object):
+    """
+    A token bucket rule: up to `limit` hits at once, refilled at `limit`
+    per `period` seconds. Parse it from strings like '30/minute'.
+    """
+    __slots__ = ('name', 'capacity', 'rate')
+
+    def __init__(self, name, limit, period):
+        self.name = name
+        self.capacity = limit
+        self.rate = limit / period
+
+    @classmethod
+    def parse(cls, name, spec):
+        count, _, period = spec.partition('/')
+        return cls(name, int(count), PERIODS[period.strip() or 'second'])
+
+    def __repr__(self):
+        return f"RateLimit('{self.name}', {self.capacity}, {self.rate:g}/s)"
+
+class MemoryRateLimiter(object):
+    """
+    Token buckets for this process, one per rule and key. A hit is O(1):
+    the bucket is refilled for the time since its last hit, then charged.
+    The least recently hit buckets beyond max_keys are dropped; a dropped
+    bucket comes back full, which only ever errs towards allowing.
+    """
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # "rule:key" -> [tokens, monotonic time of last hit]
+        self._buckets = OrderedDict()
+
+    def hit(self, rule, key, cost=1):
+        """Charges a hit and returns 0 if it is allowed, else seconds until it would be."""
+        bucket_key = f"{rule.name}:{key}"
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                bucket = self._buckets[bucket_key] = [rule.capacity, now]
+            else:
+                self._buckets.move_to_end(bucket_key)
+                bucket[0] = min(rule.capacity, bucket[0] + (now - bucket[1]) * rule.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                retry_after = 0
+            else:
+                retry_after = (cost - bucket[0]) / rule.rate
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+# The same bucket as above, run atomically inside Redis on its clock
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+class RedisRateLimiter(object):
+    """
+    Token buckets shared by every worker process through Redis. Each hit
+    is one script call. If Redis can't be reached the hit is allowed, so
+    an outage of the limiter doesn't take logins down with it.
+    """
+    def __init__(self, url, prefix='ratelimit:'):
+        import redis
+        self.prefix = prefix
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_TOKEN_BUCKET)
+
+    def hit(self, rule, key, cost=1):
+        try:
+            return float(self._script(keys=[f"{self.prefix}{rule.name}:{key}"], args=[rule.capacity, rule.rate, cost]))
+        except Exception as e:
+            current_app.logger.warning("Rate limiter unavailable, allowing request: %s", e)
+            return 0
+
+def create_rate_limiter(backend='memory', url=None, **kwargs):
+    """
+    Builds the configured limiter. backend is 'memory' (default, per
+    process) or 'redis' (shared between processes; needs the redis package).
+    """
+    if backend == 'memory':
+        return MemoryRateLimiter(**kwargs)
+    if backend == 'redis':
+        try:
+            return RedisRateLimiter(url or 'redis://localhost:6379/0', **kwargs)
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis needs the redis package (pip install redis).")
+    raise ValueError(f"Unknown rate limiter backend: {backend}")
+
+limiter = create_rate_limiter(os.getenv('RATE_LIMIT_BACKEND', 'memory'), url=os.getenv('RATE_LIMIT_REDIS_URL'))
+
+def client_ip():
+    """
+    The caller's address as a limit key, or None outside a request (e.g.
+    from the CLI). Behind a proxy this is only the client's own address
+    when TRUSTED_PROXY_HOPS is set.
+    """
+    return f"ip:{request.remote_addr}" if has_request_context() else None
+
+def user_key():
+    """The logged in user as a limit key, or None."""
+    return f"user:{current_user.id}" if has_request_context() and current_user.is_authenticated else None
+
+def check(rule, *keys):
+    """
+    Charges one hit against rule for every key that isn't None, e.g. the
+    client's IP and the account acted on. Raises RateLimited with the
+    longest wait if any of them is used up.
+    """
+    retry_after = 0
+    for key in keys:
+        if key is not None:
+            retry_after = max(retry_after, limiter.hit(rule, key))
+    if retry_after:
+        raise RateLimited(retry_after)
+
+def rate_limited(rule):
+    """Limits a view per client IP and, when logged in, per user."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            check(rule, client_ip(), user_key())
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,88 @@
+# mainSite/records.py
+
+import json
+from collections import namedtuple
+from datetime import date
+from flask import Response
+from .extensions import db
+from .models import Store, Product, Bill, BillItem
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(payload):
+    """
+    Encodes payload as compact UTF-8 JSON bytes. Dates and datetimes come
+    out as their isoformat(); orjson (when installed) does that for a whole
+    page in C, instead of one isoformat() call per column per row.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+def json_response(payload, status=200):
+    """Like jsonify(payload), status but encoded with dumps()."""
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+def record(name, model, fields, optional=('created_at', 'updated_at'), **columns):
+    """
+    Builds a read-only namedtuple class for the given fields of model. The
+    fields are named as the model's to_dict() names its keys; columns maps
+    any that aren't a column of the same name to the column to select.
+    Keys in optional are left out when None, as to_dict() does.
+    """
+    cls = namedtuple(name, fields)
+    cls.columns = tuple(columns[field] if field in columns else getattr(model, field) for field in fields)
+    cls.optional = tuple(field for field in optional if field in fields)
+    return cls
+
+StoreRecord = record('StoreRecord', Store, (
+    'id', 'name', 'email', 'tel_code', 'phone', 'addr', 'gst_no', 'owner', 'user_id', 'total_products',
+    'created_at', 'updated_at',
+), total_products=Store.product_count)
+
+ProductRecord = record('ProductRecord', Product, (
+    'id', 'name', 'quantity', 'default_pack_size', 'gst_percent', 'batch', 'mrp', 'quantity_unit', 'store_id',
+    'created_at', 'updated_at', 'expire',
+), optional=('created_at', 'updated_at', 'expire'))
+
+BillRecord = record('BillRecord', Bill, (
+    'id', 'customer_name', 'doctor_name', 'billing_date', 'status', 'store_name', 'owner_name', 'store_gst_no',
+    'store_addr', 'store_phone', 'store_id', 'created_at', 'updated_at',
+))
+
+BillItemRecord = record('BillItemRecord', BillItem, (
+    'id', 'quantity', 'mrp', 'discount_percent', 'gst_percent', 'total_price', 'bill_id', 'product_id',
+), optional=())
+
+def select_records(record_type, *criteria):
+    """
+    A query for just record_type's columns. Its rows are plain tuples in
+    field order, never ORM objects, so nothing enters the identity map;
+    they still have created_at and id attributes for keyset_paginate.
+    """
+    return db.session.query(*record_type.columns).filter(*criteria)
+
+def records(record_type, rows):
+    """Wraps rows from select_records(record_type) as record_type instances."""
+    return list(map(record_type._make, rows))
+
+def to_dicts(items):
+    """Records as the dicts their model's to_dict() returns, for dumps()."""
+    if not items:
+        return []
+    fields = items[0]._fields
+    optional = items[0].optional
+    dicts = [dict(zip(fields, item)) for item in items]
+    for data in dicts:
+        for key in optional:
+            if data[key] is None:
+                del data[key]
+    return dicts
@@ -1,83 +1,85 @@
-import sqlite3
+import io
 import os
-from flask import Flask, Blueprint, jsonify, request
+from flask import Flask, Blueprint, jsonify, request, Response, stream_with_context
 from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
 from mainSite import socket, csrf
-from mainSite.models import User, Store, Product, Bill, BillItem
-from secrets import token_urlsafe
-import datetime
-from datetime import timedelta, datetime, timezone
+from mainSite.models import User, Store, Product, Bill, BillItem, BillingError, InsufficientStockError, StaleDraftError
+from mainSite.token_store import create_token_store
+from mainSite.search_index import product_index
+from mainSite.pagination import keyset_paginate
+from mainSite.product_import import import_products
+from mainSite import exports, analytics, stock_alerts, metrics, http_cache
+from mainSite.records import StoreRecord, ProductRecord, BillRecord, BillItemRecord, select_records, records, to_dicts, json_response
+from mainSite.bill_drafts import drafts
+from mainSite.routes.sockets import bill_room, store_room
+from mainSite.jobs import job_queue
+from mainSite.tasks import scan_stock_alerts_job, rebuild_sales_rollups_job
+from mainSite.rate_limit import RateLimit, rate_limited, check as check_rate_limit, client_ip
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'tokens.db')
+DB_PATH = os.getenv('TOKEN_DB_PATH') or os.path.join(os.path.dirname(__file__), 'tokens.db')
 EXPIRATION_MINUTES = 60
+MAX_PER_PAGE = 100
 
-def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute('''CREATE TABLE IF NOT EXISTS publish_tokens (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            token TEXT UNIQUE,
-            created_at DATETIME
-        )''')
-        conn.execute('''CREATE TABLE IF NOT EXISTS otp_codes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            otp TEXT,
-            email TEXT,
-            created_at DATETIME
-        )''')
-
-init_db()
+# Each unauthenticated token request writes to the token store, and OTPs
+# are short enough to guess, so all three are throttled per IP and per account
+REQUEST_TOKEN_LIMIT = RateLimit.parse('request_token', os.getenv('RATE_LIMIT_REQUEST_TOKEN', '30/minute'))
+OTP_SEND_LIMIT = RateLimit.parse('otp_send', os.getenv('RATE_LIMIT_OTP_SEND', '5/hour'))
+OTP_VERIFY_LIMIT = RateLimit.parse('otp_verify', os.getenv('RATE_LIMIT_OTP_VERIFY', '10/hour'))
+
+# 'sqlite' is shared between worker processes, 'memory' is for single-process deployments
+token_store = metrics.instrument_token_store(create_token_store(
+    os.getenv('TOKEN_STORE_BACKEND', 'sqlite'),
+    path=DB_PATH,
+    publish_minutes=EXPIRATION_MINUTES,
+    purge_interval=int(os.getenv('TOKEN_PURGE_INTERVAL', 300)),
+))
 
 def issue_publish_token():
-    token = token_urlsafe(32)
-    created_at = datetime.now(timezone.utc)
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("INSERT INTO publish_tokens (token, created_at) VALUES (?, ?)" , (token, created_at))
-    return token
+    return token_store.issue_publish_token()
 
 def verify_publish_token(token: str) -> bool:
-    if not token:
-        return False
-    cutoff = datetime.now(timezone.utc) - timedelta(minutes=EXPIRATION_MINUTES)
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("DELETE FROM publish_tokens WHERE created_at < ?", (cutoff,))
-        cur = conn.execute("SELECT id FROM publish_tokens WHERE token=?", (token,))
-        if cur.fetchone() is not None:
-            # Token is valid, now delete it
-            conn.execute("DELETE FROM publish_tokens WHERE token=?", (token,))
-            return True
-        else:
-            return False
+    return token_store.consume_publish_token(token)
 
 def store_otp(email: str, otp: str):
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("INSERT INTO otp_codes (otp, email, created_at) VALUES (?, ?, ?)" , (otp, email, datetime.now(timezone.utc)))
+    """Raises RateLimited when too many OTPs were sent to this address or from this client."""
+    check_rate_limit(OTP_SEND_LIMIT, client_ip(), f"email:{email}")
+    token_store.store_otp(email, otp)
 
 def verify_otp(email: str, otp: str, expiry_minutes=10) -> bool:
-    cutoff = datetime.now(timezone.utc) - timedelta(minutes=expiry_minutes)
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.execute("SELECT id FROM otp_codes WHERE email=? AND otp=? AND created_at >= ?", (email, otp, cutoff))
-        if cur.fetchone() is not None:
-            conn.execute("DELETE FROM otp_codes WHERE email=? AND otp=?", (email, otp))
-            return True
-        return False
+    """Raises RateLimited after too many attempts for this address or from this client."""
+    check_rate_limit(OTP_VERIFY_LIMIT, client_ip(), f"email:{email}")
+    return token_store.consume_otp(email, otp, expiry_minutes=expiry_minutes)
 
 @api_bp.route('/status', methods=['GET'])
 def status():
     return jsonify({"status": "ok", "message": "API is working!"}), 200
 
 @api_bp.route('/request_token', methods=['GET'])
+@rate_limited(REQUEST_TOKEN_LIMIT)
 def unauth_token():
     token = issue_publish_token()
     return jsonify({"publish_token": token, "status": "ok"}), 200
 
+@api_bp.route('/csrf_token', methods=['GET'])
+def csrf_token():
+    # fetch() callers send this back in an X-CSRFToken header on their POSTs
+    response = jsonify({"csrf_token": generate_csrf(), "status": "ok"})
+    response.cache_control.no_store = True
+    return response, 200
+
 @api_bp.route('/get_stores', methods=['GET'])
 def stores_by_user():
     if not current_user.is_authenticated:
         return jsonify({"status": "error", "message":"User not authenticcated. Log In first."})
-    stores = current_user.stores
-    return jsonify({"stores":stores, "status": "ok"}), 200
+    etag, last_modified = http_cache.store_list_validators(current_user.id)
+    cached = http_cache.not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+    stores = records(StoreRecord, select_records(StoreRecord, Store.user_id == current_user.id).order_by(Store.id))
+    return http_cache.cacheable(json_response({"stores": to_dicts(stores), "status": "ok"}), etag, last_modified)
 
 @csrf.exempt
 @api_bp.route('/new_store', methods=['POST'])
@@ -108,19 +110,311 @@ def stores_by_user_paginated():
     if not current_user.is_authenticated:
         return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
 
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 9, type=int)
+    cursor = request.args.get('cursor')
+    per_page = min(request.args.get('per_page', 9, type=int), MAX_PER_PAGE)
+    etag, last_modified = http_cache.store_list_validators(current_user.id)
+    cached = http_cache.not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+    try:
+        stores_page = keyset_paginate(select_records(StoreRecord, Store.user_id == current_user.id), Store, cursor, per_page)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
-    # Correct way to get a query and paginate it
-    stores_pagination = Store.query.filter_by(user_id=current_user.id).order_by(Store.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    
-    stores_list = [store.to_dict() for store in stores_pagination.items]
-    
-    return jsonify({
+    stores_list = to_dicts(records(StoreRecord, stores_page.items))
+
+    return http_cache.cacheable(json_response({
         "stores": stores_list,
-        "has_next": stores_pagination.has_next,
-        "page": stores_pagination.page,
+        "has_next": stores_page.has_next,
+        "next_cursor": stores_page.next_cursor,
+        "status": "ok"
+    }), etag, last_modified)
+
+def owned_store_or_none(store_id):
+    return Store.query.filter_by(id=store_id, user_id=current_user.id).first()
+
+@api_bp.route('/stores/<int:store_id>/products', methods=['GET'])
+def products_by_store(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    store = owned_store_or_none(store_id)
+    if store is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    etag, last_modified = http_cache.store_validators(store, 'products')
+    cached = http_cache.not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+
+    cursor = request.args.get('cursor')
+    per_page = min(request.args.get('per_page', 20, type=int), MAX_PER_PAGE)
+    try:
+        products_page = keyset_paginate(select_records(ProductRecord, Product.store_id == store_id), Product, cursor, per_page)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return http_cache.cacheable(json_response({
+        "products": to_dicts(records(ProductRecord, products_page.items)),
+        "has_next": products_page.has_next,
+        "next_cursor": products_page.next_cursor,
         "status": "ok"
-    }), 200
\ No newline at end of file
+    }), etag, last_modified)
+
+@api_bp.route('/stores/<int:store_id>/bills', methods=['GET'])
+def bills_by_store(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    store = owned_store_or_none(store_id)
+    if store is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    etag, last_modified = http_cache.store_validators(store, 'bills')
+    cached = http_cache.not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+
+    cursor = request.args.get('cursor')
+    per_page = min(request.args.get('per_page', 20, type=int), MAX_PER_PAGE)
+    try:
+        bills_page = keyset_paginate(select_records(BillRecord, Bill.store_id == store_id), Bill, cursor, per_page)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return http_cache.cacheable(json_response({
+        "bills": to_dicts(records(BillRecord, bills_page.items)),
+        "has_next": bills_page.has_next,
+        "next_cursor": bills_page.next_cursor,
+        "status": "ok"
+    }), etag, last_modified)
+
+@api_bp.route('/stores/<int:store_id>/products/search', methods=['GET'])
+def search_store_products(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    query = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    # Checking the store's owner and version is the only DB work a typeahead request does
+    index = product_index.get(store_id)
+    if index is None or index.user_id != current_user.id:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    results = index.search(query, limit)
+    return jsonify({"products": results, "status": "ok"}), 200
+
+@api_bp.route('/stores/<int:store_id>/products/import', methods=['POST'])
+def import_store_products(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    if owned_store_or_none(store_id) is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    # Either a multipart upload (spooled to disk by werkzeug) or a raw text/csv body
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    result = import_products(store_id, text_stream)
+    return jsonify({**result.to_dict(), "status": "ok"}), 200
+
+@api_bp.route('/stores/<int:store_id>/bills', methods=['POST'])
+def create_store_bill(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    store = owned_store_or_none(store_id)
+    if store is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        bill, items = Bill.create_bill(
+            store, data.get('items'),
+            customer_name=data.get('customer_name'),
+            doctor_name=data.get('doctor_name'),
+        )
+    except InsufficientStockError as e:
+        return jsonify({"status": "error", "message": str(e), "product_ids": e.product_ids}), 409
+    except BillingError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"bill": bill.to_dict(), "items": items, "status": "ok"}), 201
+
+@api_bp.route('/stores/<int:store_id>/bills/drafts', methods=['POST'])
+def create_store_bill_draft(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    store = owned_store_or_none(store_id)
+    if store is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    data = request.get_json(silent=True) or {}
+    draft = Bill.create_draft(store, customer_name=data.get('customer_name'), doctor_name=data.get('doctor_name'))
+    return jsonify({"bill": draft.to_dict(), "room": bill_room(draft.id), "status": "ok"}), 201
+
+@api_bp.route('/bills/<int:bill_id>', methods=['GET'])
+def get_bill(bill_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    bill = Bill.query.join(Store).filter(Bill.id == bill_id, Store.user_id == current_user.id).first()
+    if bill is None:
+        return jsonify({"status": "error", "message": "Bill not found."}), 404
+    etag, last_modified = http_cache.bill_validators(bill)
+    cached = http_cache.not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+    items = records(BillItemRecord, select_records(BillItemRecord, BillItem.bill_id == bill.id).order_by(BillItem.id))
+    return http_cache.cacheable(json_response({
+        "bill": bill.to_dict(),
+        "items": to_dicts(items),
+        "totals": bill.totals(),
+        "status": "ok"
+    }), etag, last_modified)
+
+@api_bp.route('/bills/<int:bill_id>/finalize', methods=['POST'])
+def finalize_bill_draft(bill_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    draft = drafts.get(bill_id)
+    if draft is None or draft.user_id != current_user.id:
+        return jsonify({"status": "error", "message": "Draft bill not found."}), 404
+    bill = Bill.query.get(bill_id)
+    # The locks are held until the bill is written: deltas wait for them and
+    # are then refused, and neither they nor a background save can write
+    # the draft once it is marked finalized. Another process's copy is
+    # kept out by the guarded UPDATE in create_bill.
+    with draft.save_lock, draft.lock:
+        if draft.finalized:
+            return jsonify({"status": "error", "message": "Draft bill not found."}), 404
+        draft.finalized = True
+        items = [{
+            'product_id': line.product_id,
+            'quantity': line.quantity,
+            'discount_percent': line.discount_percent,
+            'mrp': line.mrp,
+            'gst_percent': line.gst_percent,
+        } for line in draft.lines.values()]
+        try:
+            bill, items = Bill.create_bill(
+                bill.store, items,
+                customer_name=bill.customer_name,
+                doctor_name=bill.doctor_name,
+                draft=bill,
+                draft_version=draft.saved_version,
+            )
+        except StaleDraftError as e:
+            # This copy is out of date; the next access reloads the saved bill
+            drafts.discard(bill_id)
+            return jsonify({"status": "error", "message": str(e)}), 409
+        except InsufficientStockError as e:
+            draft.finalized = False
+            return jsonify({"status": "error", "message": str(e), "product_ids": e.product_ids}), 409
+        except BillingError as e:
+            draft.finalized = False
+            return jsonify({"status": "error", "message": str(e)}), 400
+        except Exception:
+            draft.finalized = False
+            raise
+    drafts.discard(bill_id)
+    socket.emit('bill_finalized', {"bill_id": bill_id}, to=bill_room(bill_id))
+    return jsonify({"bill": bill.to_dict(), "items": items, "status": "ok"}), 200
+
+def export_response(rows, columns, export_format, filename):
+    body = stream_with_context(exports.encode_rows(rows, columns, export_format))
+    return Response(body, mimetype=exports.EXPORT_FORMATS[export_format], headers={
+        "Content-Disposition": f"attachment; filename={filename}.{export_format}"
+    })
+
+@api_bp.route('/stores/<int:store_id>/bills/export', methods=['GET'])
+def export_store_bills(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    if owned_store_or_none(store_id) is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    export_format = request.args.get('format', 'csv')
+    if export_format not in exports.EXPORT_FORMATS:
+        return jsonify({"status": "error", "message": "format must be csv or ndjson."}), 400
+    start, end = request.args.get('start'), request.args.get('end')
+    try:
+        start_at, end_before = exports.parse_date_range(start, end)
+    except ValueError:
+        return jsonify({"status": "error", "message": "start and end must be dates like 2026-04-01."}), 400
+    rows = exports.bill_item_rows(store_id, start_at, end_before)
+    filename = f"store-{store_id}-bills-{start or 'all'}-{end or 'all'}"
+    return export_response(rows, exports.BILL_ITEM_COLUMNS, export_format, filename)
+
+@api_bp.route('/stores/<int:store_id>/products/export', methods=['GET'])
+def export_store_products(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    if owned_store_or_none(store_id) is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    export_format = request.args.get('format', 'csv')
+    if export_format not in exports.EXPORT_FORMATS:
+        return jsonify({"status": "error", "message": "format must be csv or ndjson."}), 400
+    rows = exports.product_rows(store_id)
+    return export_response(rows, exports.PRODUCT_COLUMNS, export_format, f"store-{store_id}-products")
+
+@api_bp.route('/stores/<int:store_id>/analytics/sales', methods=['GET'])
+def store_sales(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    if owned_store_or_none(store_id) is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    interval = request.args.get('interval', 'day')
+    if interval not in analytics.INTERVALS:
+        return jsonify({"status": "error", "message": "interval must be day or month."}), 400
+    try:
+        start_day, end_day = analytics.parse_day_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({"status": "error", "message": "start and end must be dates like 2026-04-01."}), 400
+    sales = analytics.sales_series(store_id, start_day, end_day, interval)
+    return jsonify({**sales, "status": "ok"}), 200
+
+@api_bp.route('/stores/<int:store_id>/analytics/top_products', methods=['GET'])
+def store_top_products(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    if owned_store_or_none(store_id) is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    order_by = request.args.get('by', 'revenue')
+    if order_by not in analytics.TOP_PRODUCTS_ORDER:
+        return jsonify({"status": "error", "message": "by must be revenue, quantity or gst."}), 400
+    limit = min(request.args.get('limit', 10, type=int), analytics.MAX_TOP_PRODUCTS)
+    try:
+        start_day, end_day = analytics.parse_day_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({"status": "error", "message": "start and end must be dates like 2026-04-01."}), 400
+    products = analytics.top_products(store_id, start_day, end_day, order_by, max(limit, 1))
+    return jsonify({"products": products, "status": "ok"}), 200
+
+@api_bp.route('/stores/<int:store_id>/alerts', methods=['GET'])
+def store_alerts(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    if owned_store_or_none(store_id) is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    days = request.args.get('days', stock_alerts.EXPIRY_DAYS, type=int)
+    low_stock = request.args.get('low_stock', stock_alerts.LOW_STOCK, type=int)
+    alerts = stock_alerts.scan_stores([store_id], expiry_days=days, low_stock=low_stock)
+    return jsonify({**alerts.get(store_id, {'expiring': [], 'low_stock': []}), "status": "ok"}), 200
+
+@api_bp.route('/stores/<int:store_id>/alerts/scan', methods=['POST'])
+def queue_store_alert_scan(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    if owned_store_or_none(store_id) is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    # The alerts and the job's progress arrive in the store's SocketIO room
+    job_id = scan_stock_alerts_job.enqueue(
+        {'store_ids': [store_id]}, dedupe_key=f"alerts:{store_id}", room=store_room(store_id), owner_id=current_user.id)
+    return jsonify({"job_id": job_id, "room": store_room(store_id), "status": "ok"}), 202
+
+@api_bp.route('/stores/<int:store_id>/analytics/rebuild', methods=['POST'])
+def queue_sales_rollup_rebuild(store_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    if owned_store_or_none(store_id) is None:
+        return jsonify({"status": "error", "message": "Store not found."}), 404
+    job_id = rebuild_sales_rollups_job.enqueue(
+        {'store_id': store_id}, dedupe_key=f"rollups:{store_id}", room=store_room(store_id), owner_id=current_user.id)
+    return jsonify({"job_id": job_id, "room": store_room(store_id), "status": "ok"}), 202
+
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    if not current_user.is_authenticated:
+        return jsonify({"status": "error", "message":"User not authenticated. Log In first."}), 401
+    job = job_queue.get(job_id)
+    if job is None or job.pop('owner_id') != current_user.id:
+        return jsonify({"status": "error", "message": "Job not found."}), 404
+    return jsonify({"job": job, "status": "ok"}), 200
@@ -1,12 +1,17 @@
+import os
 from flask import Blueprint, request, render_template, redirect, url_for, flash
 from mainSite import socket
 from flask_login import login_user, logout_user, current_user, login_required
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_wtf.csrf import generate_csrf, validate_csrf
 from mainSite.models import User
+from mainSite.passwords import hasher, HashingBusy
+from mainSite.rate_limit import RateLimit, RateLimited, check as check_rate_limit, client_ip
 
 auth_bp = Blueprint('auth', __name__)
 
+# Counted per client IP and per phone number tried, against password guessing
+LOGIN_LIMIT = RateLimit.parse('login', os.getenv('RATE_LIMIT_LOGIN', '10/minute'))
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -14,9 +19,22 @@ def login():
         # Handle login logic
         phone = request.form['phone']
         password = request.form['password']
+        try:
+            check_rate_limit(LOGIN_LIMIT, client_ip(), f"phone:{phone}")
+        except RateLimited as e:
+            flash(str(e), 'warning')
+            return render_template('login.html', csrf_token=generate_csrf(), user=current_user), 429, {'Retry-After': str(e.retry_after)}
         user = User.get_by_phone(phone)
         # Check fields first
-        if user and check_password_hash(user.password, password):
+        try:
+            matches, needs_rehash = hasher.verify(user.password, password) if user else (False, False)
+            if matches and needs_rehash:
+                # The hashing policy changed since this password was set
+                user = User.edit_user(user.id, password=hasher.hash(password))
+        except HashingBusy as e:
+            flash(str(e), 'warning')
+            return render_template('login.html', csrf_token=generate_csrf(), user=current_user), 503
+        if matches:
             login_user(user, remember=True)
             flash('Login successful!', 'success')
             return redirect(url_for('views.home'))
@@ -63,7 +81,11 @@ def signup():
         if user:
             flash('Phone Number already registered. Please log in.', 'warning')
             return redirect(url_for('auth.login'))
-        hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+        try:
+            hashed_password = hasher.hash(password)
+        except HashingBusy as e:
+            flash(str(e), 'warning')
+            return redirect(url_for('auth.signup'))
         new_user = User.create_user(name=name, phone=phone, tel_code=tel_code, addr=address+'\n'+address2, gstno=gstno, password=hashed_password)
         login_user(new_user, remember=True)
         flash(f'Signed up as {name}!.', 'success')
@@ -0,0 +1,158 @@
+import os
+import threading
+from flask import current_app, request
+from flask_login import current_user
+from flask_socketio import join_room, leave_room, emit
+from mainSite import socket
+from mainSite.bill_drafts import drafts, DraftError, bill_room
+from mainSite.models import Store
+from mainSite import stock_alerts
+from mainSite.jobs import job_queue
+
+# Seconds between coalesced saves of edited drafts
+DRAFT_SAVE_INTERVAL = float(os.getenv('DRAFT_SAVE_INTERVAL', 5))
+
+# Seconds between stock alert scans of every store
+ALERT_SCAN_INTERVAL = float(os.getenv('ALERT_SCAN_INTERVAL', 3600))
+
+_saver_started = False
+_saver_lock = threading.Lock()
+_scanner_started = False
+_scanner_lock = threading.Lock()
+
+def store_room(store_id):
+    return f"store:{store_id}"
+
+def _save_drafts_forever(app):
+    while True:
+        socket.sleep(DRAFT_SAVE_INTERVAL)
+        with app.app_context():
+            try:
+                drafts.save_dirty()
+                drafts.evict_expired()
+            except Exception as e:
+                app.logger.exception("Saving bill drafts failed: %s", e)
+
+def start_draft_saver():
+    """Starts the background saver once, on the first draft that gets opened."""
+    global _saver_started
+    with _saver_lock:
+        if _saver_started:
+            return
+        _saver_started = True
+    socket.start_background_task(_save_drafts_forever, current_app._get_current_object())
+
+def push_stock_alerts(results):
+    """Sends each store's alerts from a scan to that store's room."""
+    for store_id, alerts in results.items():
+        socket.emit('stock_alerts', {'store_id': store_id, **alerts}, to=store_room(store_id))
+
+def _scan_alerts_forever(app):
+    # With a message queue every process's emits reach every client, so of
+    # all the processes running this loop only the one holding the lease
+    # scans in a given interval. Without one each process scans for its own clients.
+    shared = bool(socket.server_options.get('message_queue'))
+    while True:
+        with app.app_context():
+            try:
+                if not shared or job_queue.acquire_lease('stock_alert_scan', ALERT_SCAN_INTERVAL):
+                    stock_alerts.scan_all(on_batch=push_stock_alerts)
+            except Exception as e:
+                app.logger.exception("Stock alert scan failed: %s", e)
+        socket.sleep(ALERT_SCAN_INTERVAL)
+
+def start_alert_scanner():
+    """Starts the periodic alert scan once, when the first store room is joined."""
+    global _scanner_started
+    with _scanner_lock:
+        if _scanner_started or ALERT_SCAN_INTERVAL <= 0:
+            return
+        _scanner_started = True
+    socket.start_background_task(_scan_alerts_forever, current_app._get_current_object())
+
+def owned_store_id(data):
+    """Returns the caller's store id named in data, or None after emitting an error."""
+    if not current_user.is_authenticated:
+        emit('store_error', {'message': 'User not authenticated. Log In first.'})
+        return None
+    try:
+        store_id = int(data['store_id'])
+    except (KeyError, TypeError, ValueError):
+        emit('store_error', {'message': 'store_id is required.'})
+        return None
+    owned = Store.query.filter_by(id=store_id, user_id=current_user.id).with_entities(Store.id).first()
+    if owned is None:
+        emit('store_error', {'store_id': store_id, 'message': 'Store not found.'})
+        return None
+    return store_id
+
+def owned_draft(data):
+    """Returns the caller's draft named in data, or None after emitting an error."""
+    if not current_user.is_authenticated:
+        emit('bill_error', {'message': 'User not authenticated. Log In first.'})
+        return None
+    try:
+        bill_id = int(data['bill_id'])
+    except (KeyError, TypeError, ValueError):
+        emit('bill_error', {'message': 'bill_id is required.'})
+        return None
+    draft = drafts.get(bill_id)
+    if draft is None or draft.user_id != current_user.id:
+        emit('bill_error', {'bill_id': bill_id, 'message': 'Draft bill not found.'})
+        return None
+    return draft
+
+@socket.on('store_join')
+def on_store_join(data):
+    store_id = owned_store_id(data)
+    if store_id is None:
+        return
+    start_alert_scanner()
+    join_room(store_room(store_id))
+    # The joining client gets the store's current alerts straight away
+    alerts = stock_alerts.scan_stores([store_id]).get(store_id, {'expiring': [], 'low_stock': []})
+    emit('stock_alerts', {'store_id': store_id, **alerts})
+
+@socket.on('store_leave')
+def on_store_leave(data):
+    store_id = owned_store_id(data)
+    if store_id is not None:
+        leave_room(store_room(store_id))
+
+@socket.on('bill_join')
+def on_bill_join(data):
+    draft = owned_draft(data)
+    if draft is None:
+        return
+    start_draft_saver()
+    join_room(bill_room(draft.bill_id))
+    # Only the joining client needs the full state; everyone else gets deltas
+    emit('bill_state', draft.snapshot())
+
+@socket.on('bill_sync')
+def on_bill_sync(data):
+    """Resends the full state, for a client that noticed a gap in versions."""
+    draft = owned_draft(data)
+    if draft is not None:
+        emit('bill_state', draft.snapshot())
+
+@socket.on('bill_leave')
+def on_bill_leave(data):
+    draft = owned_draft(data)
+    if draft is not None:
+        leave_room(bill_room(draft.bill_id))
+
+@socket.on('bill_delta')
+def on_bill_delta(data):
+    draft = owned_draft(data)
+    if draft is None:
+        return
+    try:
+        applied = drafts.apply(draft.bill_id, data)
+    except DraftError as e:
+        emit('bill_error', {'bill_id': draft.bill_id, 'message': str(e)})
+        return
+    # Echo the client's own id back so it can match the ack to its pending edit
+    applied['client_ref'] = data.get('client_ref')
+    applied['sender'] = request.sid
+    emit('bill_delta', applied, to=bill_room(draft.bill_id))
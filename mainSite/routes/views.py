@@ -1,13 +1,22 @@
-from flask import Flask, Blueprint, jsonify, request, render_template, redirect, url_for
+from flask import Flask, Blueprint, jsonify, request, render_template, redirect, url_for, make_response
 from flask_login import current_user, login_required
-from mainSite import socket
+from mainSite import socket, http_cache
 from mainSite.models import Store, Product
+from mainSite.pagination import keyset_paginate
 
 views_bp = Blueprint('views', __name__)
 
+# Same as the first page /api/stores_paginated serves to load_stores.js
+HOME_STORES_PER_PAGE = 9
+
 @views_bp.route('/', methods=['GET'])
 def home():
-    return render_template('home.html', user=current_user)
+    stores, next_cursor = [], None
+    if current_user.is_authenticated:
+        # The first page is rendered with the page (cards come from the fragment cache)
+        page = keyset_paginate(Store.query.filter_by(user_id=current_user.id), Store, None, HOME_STORES_PER_PAGE)
+        stores, next_cursor = page.items, page.next_cursor
+    return render_template('home.html', user=current_user, stores=stores, next_cursor=next_cursor)
 
 @views_bp.route('/about', methods=['GET'])
 def about():
@@ -28,5 +37,11 @@ def user_settings():
 @login_required
 @views_bp.route('/stores/<int:store_id>', methods=['GET','POST'])
 def view_stores(store_id):
-    store = Store.query.filter_by(id = store_id, user_id = current_user.id).first_or_404().to_dict()
-    return render_template('stores.html', store=store)
\ No newline at end of file
+    store = Store.query.filter_by(id = store_id, user_id = current_user.id).first_or_404()
+    # The page header shows the user's name, so their edits count too
+    etag, last_modified = http_cache.store_validators(store, 'page', current_user.updated_at)
+    cached = http_cache.not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+    response = make_response(render_template('stores.html', store=store.to_dict(), store_version=store.version))
+    return http_cache.cacheable(response, etag, last_modified)
\ No newline at end of file
@@ -0,0 +1,259 @@
+# mainSite/search_index.py
+
+import threading
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+
+def _words(text):
+    return text.lower().split()
+
+def trigrams(text, partial=False):
+    """
+    Splits text into pg_trgm style trigrams: each word is padded with two
+    leading spaces and one trailing space. With partial=True the last word
+    gets no trailing pad, so a half typed word still matches as a prefix.
+    """
+    words = _words(text)
+    grams = set()
+    for i, word in enumerate(words):
+        padded = '  ' + word
+        if not (partial and i == len(words) - 1):
+            padded += ' '
+        for j in range(len(padded) - 2):
+            grams.add(padded[j:j + 3])
+    return grams
+
+class StoreProductIndex(object):
+    """
+    Trigram and prefix index over the name and batch of one store's products.
+    Holds a small payload per product so results can be served without the DB.
+    version is the Store.version the index reflects.
+    """
+    SIMILARITY_THRESHOLD = 0.3
+
+    def __init__(self, store_id, user_id, version=0):
+        self.store_id = store_id
+        self.user_id = user_id
+        self.version = version
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.postings = {}
+        # Sorted (lowered text, product id) pairs for prefix lookups
+        self.sorted_keys = []
+
+    def _index_terms(self, entry):
+        terms = [entry['name']]
+        if entry['batch']:
+            terms.append(entry['batch'])
+        return [term.lower() for term in terms]
+
+    def add(self, entry):
+        self.remove(entry['id'])
+        grams = set()
+        for term in self._index_terms(entry):
+            grams |= trigrams(term)
+            pos = bisect_left(self.sorted_keys, (term, entry['id']))
+            self.sorted_keys.insert(pos, (term, entry['id']))
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(entry['id'])
+        self.entries[entry['id']] = (entry, grams)
+
+    def remove(self, product_id):
+        existing = self.entries.pop(product_id, None)
+        if existing is None:
+            return
+        entry, grams = existing
+        for gram in grams:
+            ids = self.postings.get(gram)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self.postings[gram]
+        for term in self._index_terms(entry):
+            pos = bisect_left(self.sorted_keys, (term, product_id))
+            if pos < len(self.sorted_keys) and self.sorted_keys[pos] == (term, product_id):
+                del self.sorted_keys[pos]
+
+    def _prefix_matches(self, query):
+        matches = []
+        pos = bisect_left(self.sorted_keys, (query,))
+        while pos < len(self.sorted_keys) and self.sorted_keys[pos][0].startswith(query):
+            matches.append(self.sorted_keys[pos][1])
+            pos += 1
+        return matches
+
+    def search(self, query, limit=10):
+        """
+        Returns up to limit product payloads ranked by relevance: whole-text
+        prefix matches first, then substring matches, then fuzzy trigram
+        matches above SIMILARITY_THRESHOLD.
+        """
+        with self.lock:
+            return self._search(query, limit)
+
+    def _search(self, query, limit):
+        query = ' '.join(_words(query))
+        if not query:
+            return []
+        scores = {}
+        for product_id in self._prefix_matches(query):
+            scores[product_id] = 3.0
+        query_grams = trigrams(query, partial=True)
+        # Trigrams without padding appear in any text containing the query,
+        # so products holding all of them are the substring candidates. Set
+        # intersection keeps this cheap even when single trigrams are common.
+        inner_grams = [gram for gram in query_grams if ' ' not in gram] or query_grams
+        postings = sorted((self.postings.get(gram, ()) for gram in inner_grams), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:]) if postings[0] else set()
+        for product_id in candidates:
+            entry, grams = self.entries[product_id]
+            if any(query in term for term in self._index_terms(entry)):
+                scores[product_id] = scores.get(product_id, 0.0) + 1.0 + len(query_grams) / len(grams)
+        if len(scores) >= limit:
+            return self._ranked(scores, limit)
+        # Not enough direct hits, fall back to fuzzy trigram similarity
+        hits = Counter()
+        for gram in query_grams:
+            hits.update(self.postings.get(gram, ()))
+        for product_id, shared in hits.items():
+            if product_id in scores:
+                continue
+            entry, grams = self.entries[product_id]
+            similarity = shared / (len(query_grams) + len(grams) - shared)
+            if similarity >= self.SIMILARITY_THRESHOLD:
+                scores[product_id] = similarity
+        return self._ranked(scores, limit)
+
+    def _ranked(self, scores, limit):
+        ranked = sorted(scores, key=lambda pid: (-scores[pid], self.entries[pid][0]['name'].lower()))
+        return [self.entries[pid][0] for pid in ranked[:limit]]
+
+class ProductSearchIndex(object):
+    """
+    Process-wide registry of per-store indexes. A store's index is built
+    lazily on its first search and kept current by the Product classmethods.
+    The least recently searched stores are dropped past max_stores.
+
+    Other processes (web workers, imports, jobs) change products too, so
+    every lookup reads the store's version, and an index whose version
+    differs is rebuilt. Each change this process applies to a built index
+    matches exactly one bump of the store's version, and bumps the
+    index's version with it; if any other bump happened meanwhile, the
+    two still differ and the index is rebuilt.
+    """
+    def __init__(self, max_stores=256):
+        self.max_stores = max_stores
+        self._lock = threading.Lock()
+        self._stores = OrderedDict()
+
+    @staticmethod
+    def entry_for(product):
+        """Builds the payload kept in the index for a Product."""
+        return {
+            'id': product.id,
+            'name': product.name,
+            'batch': product.batch,
+            'mrp': product.mrp,
+            'gst_percent': product.gst_percent,
+            'quantity': product.quantity,
+            'quantity_unit': product.quantity_unit,
+            'default_pack_size': product.default_pack_size,
+            'expire': product.expire.isoformat() if product.expire else None,
+        }
+
+    def _build(self, store_id, user_id, version):
+        # Imported here to avoid a circular import with models
+        from .models import Product
+        index = StoreProductIndex(store_id, user_id, version)
+        columns = (Product.id, Product.name, Product.batch, Product.mrp, Product.gst_percent,
+                   Product.quantity, Product.quantity_unit, Product.default_pack_size, Product.expire)
+        for row in Product.query.with_entities(*columns).filter(Product.store_id == store_id):
+            index.add(self.entry_for(row))
+        return index
+
+    def get(self, store_id):
+        """
+        Returns the store's index, building it on first use or when the
+        store's version has moved past it, or None for a missing store.
+        Costs one primary key lookup while the index is current.
+        """
+        from .models import Store
+        store = Store.query.with_entities(Store.user_id, Store.version).filter_by(id=store_id).first()
+        if store is None:
+            self.invalidate(store_id)
+            return None
+        with self._lock:
+            index = self._stores.get(store_id)
+            if index is not None and index.version == store.version and index.user_id == store.user_id:
+                self._stores.move_to_end(store_id)
+                return index
+        # The version is read before the products, so a change committed
+        # in between only costs one more rebuild
+        index = self._build(store_id, store.user_id, store.version)
+        with self._lock:
+            current = self._stores.get(store_id)
+            # Another thread may have built it meanwhile; keep the newer one
+            if current is not None and current.version >= index.version:
+                index = current
+            else:
+                self._stores[store_id] = index
+            self._stores.move_to_end(store_id)
+            while len(self._stores) > self.max_stores:
+                self._stores.popitem(last=False)
+        return index
+
+    def _loaded(self, store_id):
+        with self._lock:
+            return self._stores.get(store_id)
+
+    def search(self, store_id, query, limit=10):
+        index = self.get(store_id)
+        if index is None:
+            return []
+        return index.search(query, limit)
+
+    def add_product(self, product):
+        """Adds or replaces a product, but only in an index that is already built."""
+        index = self._loaded(product.store_id)
+        if index is not None:
+            with index.lock:
+                index.add(self.entry_for(product))
+                index.version += 1
+
+    def update_product(self, product, old_store_id=None):
+        if old_store_id is not None and old_store_id != product.store_id:
+            self.remove_product(old_store_id, product.id)
+        self.add_product(product)
+
+    def remove_product(self, store_id, product_id):
+        index = self._loaded(store_id)
+        if index is not None:
+            with index.lock:
+                index.remove(product_id)
+                index.version += 1
+
+    def adjust_quantities(self, store_id, deltas):
+        """Applies {product_id: change} stock changes to a built index."""
+        index = self._loaded(store_id)
+        if index is None:
+            return
+        with index.lock:
+            for product_id, delta in deltas.items():
+                existing = index.entries.get(product_id)
+                if existing is not None:
+                    existing[0]['quantity'] += delta
+            index.version += 1
+
+    def touch(self, store_id):
+        """Follows a bump of the store's version that changed no product, e.g. a saved bill draft."""
+        index = self._loaded(store_id)
+        if index is not None:
+            with index.lock:
+                index.version += 1
+
+    def invalidate(self, store_id):
+        """Drops a store's index so the next search rebuilds it from the DB."""
+        with self._lock:
+            self._stores.pop(store_id, None)
+
+product_index = ProductSearchIndex()
@@ -1,9 +1,10 @@
 const addStoreDiv = document.querySelector(".addStore");
 const loadingIndicator = document.getElementById('loading');
 
-let currentPage = 1;
+// The first page of stores is rendered with the page, so scrolling continues after it
+let nextCursor = document.querySelector(".storesGrid").dataset.nextCursor || null;
 let isLoading = false;
-let hasMore = true;
+let hasMore = nextCursor !== null;
 
 function displayStore(storeData){
     // Create the anchor tag to wrap the store content
@@ -52,20 +53,21 @@ function displayStore(storeData){
     }
 }
 
-const fetchStores = async (page) => {
+const fetchStores = async () => {
     if (isLoading || !hasMore) return;
     isLoading = true;
     loadingIndicator.style.display = 'block';
 
     try {
-        const response = await fetch(`/api/stores_paginated?page=${page}`);
+        const query = nextCursor ? `?cursor=${encodeURIComponent(nextCursor)}` : '';
+        const response = await fetch(`/api/stores_paginated${query}`);
         const data = await response.json();
         
         if (data.status === "ok") {
             data.stores.forEach(store => {
                 displayStore(store);
             });
-            currentPage++;
+            nextCursor = data.next_cursor;
             hasMore = data.has_next;
         } else {
             console.error("Error fetching stores:", data.message);
@@ -89,12 +91,7 @@ window.addEventListener('scroll', () => {
         throttleTimeout = null;
         if (window.innerHeight + window.scrollY >= document.body.offsetHeight - 800) {
             console.log('Fetching more stores...');
-            fetchStores(currentPage);
+            fetchStores();
         }
     }, 200); // Throttle interval
 });
-
-// Initial load of stores
-document.addEventListener('DOMContentLoaded', () => {
-    fetchStores(currentPage);
-});
\ No newline at end of file
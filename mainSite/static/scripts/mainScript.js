@@ -23,6 +23,31 @@ function createMessage(type, message) {
     }, 6000);
 }
 
+// The API's POST endpoints check the same CSRF token the forms send in a
+// hidden input; fetch() calls send it in the X-CSRFToken header instead.
+// Tokens expire, so a refused one is replaced and the request sent again.
+let csrfToken = null;
+
+async function fetchCsrfToken() {
+    const response = await fetch('/api/csrf_token', {credentials: 'include'});
+    csrfToken = (await response.json()).csrf_token;
+    return csrfToken;
+}
+
+async function csrfFetch(url, options = {}) {
+    const send = (token) => fetch(url, {
+        credentials: 'include',
+        ...options,
+        headers: {...(options.headers || {}), 'X-CSRFToken': token},
+    });
+    let response = await send(csrfToken || await fetchCsrfToken());
+    const isJSON = (response.headers.get('Content-Type') || '').includes('application/json');
+    if (response.status === 400 && !isJSON) {
+        response = await send(await fetchCsrfToken());
+    }
+    return response;
+}
+
 function checkGSTIN(g){
     //Make sure g is 15 chars long
     let regTest = /\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z\d]{1}[Z]{1}[A-Z\d]{1}/.test(g)
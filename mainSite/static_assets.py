@@ -0,0 +1,115 @@
+# mainSite/static_assets.py
+
+import hashlib
+import os
+import posixpath
+import re
+import threading
+from flask import Response, current_app, request
+from werkzeug.utils import safe_join
+
+# Fingerprinted URLs never change content, so they can be cached for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Relative url(...) references in stylesheets, e.g. url('./fonts/Inter.woff2')
+CSS_URL = re.compile(r"""url\(\s*(['"]?)(?!data:|[a-z]+://|/|#)([^'")?#]+)\1\s*\)""")
+
+class StaticAssets(object):
+    """
+    Content fingerprints for the files in a static folder. url_for('static')
+    gets ?v=<fingerprint> appended, and a request carrying the current
+    fingerprint is served with a year long immutable Cache-Control. The
+    fonts and images a stylesheet loads through relative url()s are
+    fingerprinted too, by rewriting the stylesheet as it is served; its
+    own fingerprint is that of the rewritten text.
+    Entries are recomputed when a file's modification time changes.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self._lock = threading.Lock()
+        # filename -> (mtime, fingerprint, rewritten stylesheet or None)
+        self._entries = {}
+
+    def _path(self, filename):
+        return safe_join(self.folder, filename)
+
+    def _entry(self, filename):
+        path = self._path(filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except (TypeError, OSError):
+            return None
+        entry = self._entries.get(filename)
+        if entry is not None and entry[0] == mtime and not (entry[2] is not None and self._stale_css(entry[2])):
+            return entry
+        with open(path, 'rb') as f:
+            content = f.read()
+        css = None
+        if filename.endswith('.css'):
+            css, references = self._rewrite_css(filename, content.decode('utf-8'))
+            content = css.encode('utf-8')
+            css = (css, references)
+        entry = (mtime, hashlib.sha256(content).hexdigest()[:12], css)
+        with self._lock:
+            self._entries[filename] = entry
+        return entry
+
+    def _stale_css(self, css):
+        # A stylesheet is stale when any file it references got a new fingerprint
+        _, references = css
+        return any(self.fingerprint(name) != fingerprint for name, fingerprint in references)
+
+    def _rewrite_css(self, filename, text):
+        base = posixpath.dirname(filename)
+        references = []
+
+        def versioned(match):
+            quote, target = match.group(1), match.group(2)
+            name = posixpath.normpath(posixpath.join(base, target))
+            # Imported stylesheets are left alone, which also keeps import cycles finite
+            entry = None if name.endswith('.css') else self._entry(name)
+            if entry is None:
+                return match.group(0)
+            references.append((name, entry[1]))
+            return f"url({quote}{target}?v={entry[1]}{quote})"
+
+        return CSS_URL.sub(versioned, text), tuple(references)
+
+    def fingerprint(self, filename):
+        """The file's current fingerprint, or None if there is no such file."""
+        entry = self._entry(filename)
+        return entry[1] if entry else None
+
+    def stylesheet(self, filename):
+        """The rewritten text of a stylesheet, or None for other files."""
+        entry = self._entry(filename)
+        return entry[2][0] if entry and entry[2] else None
+
+def _add_fingerprint(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        fingerprint = current_app.extensions['static_assets'].fingerprint(values['filename'])
+        if fingerprint:
+            values['v'] = fingerprint
+
+def static_view(filename):
+    assets = current_app.extensions['static_assets']
+    stylesheet = assets.stylesheet(filename)
+    if stylesheet is None:
+        response = current_app.send_static_file(filename)
+    else:
+        response = Response(stylesheet, mimetype='text/css')
+        response.set_etag(assets.fingerprint(filename))
+        response.cache_control.no_cache = True
+        response.make_conditional(request)
+    if request.args.get('v') and request.args.get('v') == assets.fingerprint(filename):
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+def init_app(app):
+    """Fingerprints url_for('static') URLs and serves them with long lived cache headers."""
+    app.extensions['static_assets'] = StaticAssets(app.static_folder)
+    app.url_defaults(_add_fingerprint)
+    app.view_functions['static'] = static_view
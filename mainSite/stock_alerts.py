@@ -0,0 +1,82 @@
+# mainSite/stock_alerts.py
+
+import os
+from datetime import datetime, timedelta
+from .extensions import db
+from .models import Store, Product
+
+# Defaults for what counts as near expiry and low stock
+EXPIRY_DAYS = int(os.getenv('ALERT_EXPIRY_DAYS', 30))
+LOW_STOCK = int(os.getenv('ALERT_LOW_STOCK', 10))
+STORE_BATCH_SIZE = int(os.getenv('ALERT_STORE_BATCH_SIZE', 200))
+
+ALERT_COLUMNS = (Product.id, Product.store_id, Product.name, Product.batch, Product.expire, Product.quantity)
+
+def _alert(row, kind):
+    return {
+        'product_id': row.id,
+        'name': row.name,
+        'batch': row.batch,
+        'expire': row.expire.isoformat() if row.expire else None,
+        'quantity': row.quantity,
+        'kind': kind,
+    }
+
+def scan_stores(store_ids, expiry_days=EXPIRY_DAYS, low_stock=LOW_STOCK, now=None):
+    """
+    Finds batches expiring within expiry_days (or already expired) that are
+    still in stock, and products with at most low_stock units left, for the
+    given stores. Both are range scans on the (store_id, expire) and
+    (store_id, quantity) indexes, so the work follows the number of matches
+    rather than the size of the inventory. Returns store_id -> alerts for
+    stores with at least one alert.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now + timedelta(days=expiry_days)
+    results = {}
+    expiring = (
+        db.session.query(*ALERT_COLUMNS)
+        .filter(Product.store_id.in_(store_ids), Product.expire < cutoff, Product.quantity > 0)
+        .order_by(Product.store_id, Product.expire)
+    )
+    for row in expiring:
+        alerts = results.setdefault(row.store_id, {'expiring': [], 'low_stock': []})
+        alerts['expiring'].append(_alert(row, 'expired' if row.expire <= now else 'expiring'))
+    low = (
+        db.session.query(*ALERT_COLUMNS)
+        .filter(Product.store_id.in_(store_ids), Product.quantity <= low_stock)
+        .order_by(Product.store_id, Product.quantity)
+    )
+    for row in low:
+        alerts = results.setdefault(row.store_id, {'expiring': [], 'low_stock': []})
+        alerts['low_stock'].append(_alert(row, 'out_of_stock' if row.quantity <= 0 else 'low_stock'))
+    return results
+
+def store_id_batches(batch_size=STORE_BATCH_SIZE):
+    """Yields lists of store ids in id order, batch_size at a time, by keyset."""
+    last_id = 0
+    while True:
+        batch = [
+            row.id for row in db.session.query(Store.id)
+            .filter(Store.id > last_id).order_by(Store.id).limit(batch_size)
+        ]
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+def scan_all(expiry_days=EXPIRY_DAYS, low_stock=LOW_STOCK, batch_size=STORE_BATCH_SIZE, on_batch=None):
+    """
+    Scans every store, batch_size stores per pair of queries. on_batch is
+    called with each batch's results as they come in. Returns the number
+    of stores scanned and the number with alerts.
+    """
+    scanned = alerted = 0
+    now = datetime.utcnow()
+    for store_ids in store_id_batches(batch_size):
+        results = scan_stores(store_ids, expiry_days, low_stock, now=now)
+        scanned += len(store_ids)
+        alerted += len(results)
+        if on_batch is not None:
+            on_batch(results)
+    return scanned, alerted
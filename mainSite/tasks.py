@@ -0,0 +1,42 @@
+# mainSite/tasks.py
+
+from .extensions import db
+from .models import Store, SalesRollup
+from .jobs import task
+from . import stock_alerts
+from .routes.sockets import push_stock_alerts
+
+@task('scan_stock_alerts', queue='alerts', max_attempts=3)
+def scan_stock_alerts_job(job):
+    """
+    Scans the stores in payload['store_ids'] (every store when absent) and
+    pushes each store's alerts to its room, batch by batch.
+    """
+    days = job.payload.get('days', stock_alerts.EXPIRY_DAYS)
+    low_stock = job.payload.get('low_stock', stock_alerts.LOW_STOCK)
+    store_ids = job.payload.get('store_ids')
+    if store_ids is None:
+        total = db.session.query(db.func.count(Store.id)).scalar()
+        batches = stock_alerts.store_id_batches()
+    else:
+        total = len(store_ids)
+        size = stock_alerts.STORE_BATCH_SIZE
+        batches = (store_ids[i:i + size] for i in range(0, total, size))
+    scanned = 0
+    for batch in batches:
+        results = stock_alerts.scan_stores(batch, days, low_stock)
+        push_stock_alerts(results)
+        scanned += len(batch)
+        job.progress(scanned, total)
+
+@task('rebuild_sales_rollups', queue='rollups', max_attempts=3)
+def rebuild_sales_rollups_job(job):
+    """Rebuilds payload['store_id']'s sales rollups, or every store's, one store at a time."""
+    store_id = job.payload.get('store_id')
+    if store_id is None:
+        store_ids = [row.id for row in db.session.query(Store.id).order_by(Store.id)]
+    else:
+        store_ids = [store_id]
+    for done, sid in enumerate(store_ids, start=1):
+        SalesRollup.rebuild(sid)
+        job.progress(done, len(store_ids))
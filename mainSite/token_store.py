@@ -0,0 +1,243 @@
+# mainSite/token_store.py
+
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from secrets import token_urlsafe
+
+logger = logging.getLogger(__name__)
+
+PUBLISH_TOKEN_MINUTES = 60
+OTP_MINUTES = 10
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+def _db_time(value):
+    # Same text layout sqlite3's default datetime adapter produced, so rows
+    # written before this module existed still compare correctly.
+    return value.isoformat(sep=' ')
+
+class TokenStore(ABC):
+    """
+    Interface for storing single-use publish tokens and OTP codes.
+    Expired entries are removed by a background purge thread instead of
+    on every verification. A backend missing any of the abstract methods
+    fails when it is created rather than on first use.
+    """
+    def __init__(self, publish_minutes=PUBLISH_TOKEN_MINUTES, otp_minutes=OTP_MINUTES, purge_interval=300):
+        self.publish_ttl = timedelta(minutes=publish_minutes)
+        self.otp_ttl = timedelta(minutes=otp_minutes)
+        self.purge_interval = purge_interval
+        self._purger = None
+        self._stop = threading.Event()
+
+    def issue_publish_token(self):
+        token = token_urlsafe(32)
+        self.add_publish_token(token)
+        return token
+
+    @abstractmethod
+    def add_publish_token(self, token):
+        raise NotImplementedError
+
+    @abstractmethod
+    def consume_publish_token(self, token):
+        """
+        Validates and removes a publish token in one atomic step. Returns True
+        for exactly one caller, however many race for the same token.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def store_otp(self, email, otp):
+        raise NotImplementedError
+
+    @abstractmethod
+    def consume_otp(self, email, otp, expiry_minutes=None):
+        """Atomically validates and removes an OTP, like consume_publish_token."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_expired(self):
+        """Deletes expired entries and returns how many were removed."""
+        raise NotImplementedError
+
+    def start_purger(self):
+        """Starts the periodic background purge, once per store."""
+        if self._purger is not None or not self.purge_interval:
+            return
+        self._purger = threading.Thread(target=self._purge_loop, name='token-store-purge', daemon=True)
+        self._purger.start()
+
+    def stop_purger(self):
+        self._stop.set()
+
+    def _purge_loop(self):
+        while not self._stop.wait(self.purge_interval):
+            try:
+                self.purge_expired()
+            except Exception:
+                logger.exception("Token purge failed")
+
+class SQLiteTokenStore(TokenStore):
+    """
+    SQLite backed token store. Connections are pooled and run in WAL mode so
+    readers don't block the writer, and the created_at columns are indexed
+    for the purge.
+    """
+    def __init__(self, path, pool_size=5, purge_batch=500, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.purge_batch = purge_batch
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self.init_schema()
+
+    def _connect(self):
+        # isolation_level=None keeps every statement in autocommit mode
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                self._pool.put_nowait(conn)
+        finally:
+            self._slots.release()
+
+    def init_schema(self):
+        with self.connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS publish_tokens (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                token TEXT UNIQUE,
+                created_at DATETIME
+            )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS otp_codes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                otp TEXT,
+                email TEXT,
+                created_at DATETIME
+            )''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_publish_tokens_created_at ON publish_tokens (created_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_otp_codes_email_otp ON otp_codes (email, otp)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_otp_codes_created_at ON otp_codes (created_at)')
+
+    def add_publish_token(self, token):
+        with self.connection() as conn:
+            conn.execute("INSERT INTO publish_tokens (token, created_at) VALUES (?, ?)", (token, _db_time(_utcnow())))
+
+    def consume_publish_token(self, token):
+        if not token:
+            return False
+        cutoff = _db_time(_utcnow() - self.publish_ttl)
+        with self.connection() as conn:
+            # A single DELETE is atomic under SQLite's write lock, so only the
+            # statement that actually removed the row sees rowcount == 1.
+            cur = conn.execute("DELETE FROM publish_tokens WHERE token=? AND created_at >= ?", (token, cutoff))
+            return cur.rowcount > 0
+
+    def store_otp(self, email, otp):
+        with self.connection() as conn:
+            conn.execute("INSERT INTO otp_codes (otp, email, created_at) VALUES (?, ?, ?)", (otp, email, _db_time(_utcnow())))
+
+    def consume_otp(self, email, otp, expiry_minutes=None):
+        ttl = timedelta(minutes=expiry_minutes) if expiry_minutes is not None else self.otp_ttl
+        cutoff = _db_time(_utcnow() - ttl)
+        with self.connection() as conn:
+            # Expired duplicates are left for the background purge
+            cur = conn.execute("DELETE FROM otp_codes WHERE email=? AND otp=? AND created_at >= ?", (email, otp, cutoff))
+            return cur.rowcount > 0
+
+    def _purge_table(self, conn, table, cutoff):
+        # Deleting in small batches keeps each write lock short
+        removed = 0
+        while True:
+            cur = conn.execute(
+                f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE created_at < ? LIMIT ?)",
+                (cutoff, self.purge_batch)
+            )
+            removed += cur.rowcount
+            if cur.rowcount < self.purge_batch:
+                return removed
+
+    def purge_expired(self):
+        now = _utcnow()
+        with self.connection() as conn:
+            removed = self._purge_table(conn, 'publish_tokens', _db_time(now - self.publish_ttl))
+            removed += self._purge_table(conn, 'otp_codes', _db_time(now - self.otp_ttl))
+        return removed
+
+class MemoryTokenStore(TokenStore):
+    """
+    In-process token store with TTL expiry. Only suitable when the app runs
+    as a single process, since tokens are not shared between workers.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._publish_tokens = {}
+        self._otps = {}
+
+    def add_publish_token(self, token):
+        with self._lock:
+            self._publish_tokens[token] = time.monotonic()
+
+    def consume_publish_token(self, token):
+        if not token:
+            return False
+        with self._lock:
+            created = self._publish_tokens.pop(token, None)
+        return created is not None and time.monotonic() - created <= self.publish_ttl.total_seconds()
+
+    def store_otp(self, email, otp):
+        with self._lock:
+            self._otps[(email, otp)] = time.monotonic()
+
+    def consume_otp(self, email, otp, expiry_minutes=None):
+        ttl = timedelta(minutes=expiry_minutes) if expiry_minutes is not None else self.otp_ttl
+        with self._lock:
+            created = self._otps.pop((email, otp), None)
+        return created is not None and time.monotonic() - created <= ttl.total_seconds()
+
+    def purge_expired(self):
+        now = time.monotonic()
+        publish_ttl = self.publish_ttl.total_seconds()
+        otp_ttl = self.otp_ttl.total_seconds()
+        with self._lock:
+            expired_tokens = [k for k, v in self._publish_tokens.items() if now - v > publish_ttl]
+            for key in expired_tokens:
+                del self._publish_tokens[key]
+            expired_otps = [k for k, v in self._otps.items() if now - v > otp_ttl]
+            for key in expired_otps:
+                del self._otps[key]
+        return len(expired_tokens) + len(expired_otps)
+
+def create_token_store(backend='sqlite', path=None, **kwargs):
+    """
+    Builds the configured token store backend and starts its purge thread.
+    backend is 'sqlite' (default, shared between processes) or 'memory'.
+    """
+    if backend == 'memory':
+        store = MemoryTokenStore(**kwargs)
+    elif backend == 'sqlite':
+        store = SQLiteTokenStore(path, **kwargs)
+    else:
+        raise ValueError(f"Unknown token store backend: {backend}")
+    store.start_purger()
+    return store
@@ -0,0 +1,71 @@
+# mainSite/user_cache.py
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.orm import make_transient_to_detached
+from .extensions import db
+
+class UserCache(object):
+    """
+    Short-lived per-process cache of users for Flask-Login's user loader.
+    It keeps a detached copy of each loaded User and merges it into the
+    request's session with load=False, which attaches it without a query;
+    relationships such as user.stores still lazy-load as usual.
+
+    User.edit_user and User.delete_user invalidate this process's entry.
+    Other worker processes only see the change once their entry is older
+    than ttl, so keep ttl short.
+    """
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # user_id -> (loaded_at, detached User)
+        self._users = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Returns the user attached to the current session, or None if there is no such user."""
+        from .models import User
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+                return db.session.merge(entry[1], load=False)
+            self.misses += 1
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        # A separate copy goes into the cache, so the session's own instance
+        # stays attached and can be changed and committed as usual.
+        snapshot = User(**{column.key: getattr(user, column.key) for column in User.__mapper__.column_attrs})
+        make_transient_to_detached(snapshot)
+        with self._lock:
+            self._users[user_id] = (now, snapshot)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_entries:
+                self._users.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(int(user_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._users), 'hits': self.hits, 'misses': self.misses}
+
+user_cache = UserCache(
+    ttl=float(os.getenv('USER_CACHE_TTL', 30)),
+    max_entries=int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000)),
+)
@@ -0,0 +1,32 @@
+"""add store product_count
+
+Revision ID: a1c3e5f70b21
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f70b21'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stores', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('product_count', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill the counter from the existing products
+    op.execute(
+        "UPDATE stores SET product_count = "
+        "(SELECT COUNT(products.id) FROM products WHERE products.store_id = stores.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('stores', schema=None) as batch_op:
+        batch_op.drop_column('product_count')
@@ -0,0 +1,39 @@
+"""add bill item mrp
+
+Revision ID: b6e8f2a4c159
+Revises: a9d4c2e7b318
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e8f2a4c159'
+down_revision = 'a9d4c2e7b318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bill_items', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('mrp', sa.Float(), nullable=True))
+
+    # Existing lines only kept their rounded total, so the unit MRP is
+    # worked back from it to the nearest paisa. Fully discounted lines
+    # stored 0 and take the product's current MRP.
+    op.execute(
+        "UPDATE bill_items SET mrp = CASE "
+        "WHEN discount_percent < 100 AND quantity > 0 "
+        "THEN ROUND(total_price * 100 / (100 - discount_percent) / quantity, 2) "
+        "ELSE (SELECT products.mrp FROM products WHERE products.id = bill_items.product_id) END"
+    )
+
+    with op.batch_alter_table('bill_items', schema=None) as batch_op:
+        batch_op.alter_column('mrp', existing_type=sa.Float(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bill_items', schema=None) as batch_op:
+        batch_op.drop_column('mrp')
@@ -0,0 +1,38 @@
+"""index foreign keys and billing date
+
+Revision ID: c7e9a3b5d214
+Revises: b4d2f6a81c37
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e9a3b5d214'
+down_revision = 'b4d2f6a81c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # stores.user_id, products.store_id and bills.store_id are already the
+    # leading columns of the keyset pagination indexes.
+    with op.batch_alter_table('bills', schema=None) as batch_op:
+        batch_op.create_index('ix_bills_store_billing_date', ['store_id', 'billing_date'], unique=False)
+        batch_op.create_index('ix_bills_billing_date', ['billing_date'], unique=False)
+
+    with op.batch_alter_table('bill_items', schema=None) as batch_op:
+        batch_op.create_index('ix_bill_items_bill', ['bill_id'], unique=False)
+        batch_op.create_index('ix_bill_items_product', ['product_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bill_items', schema=None) as batch_op:
+        batch_op.drop_index('ix_bill_items_product')
+        batch_op.drop_index('ix_bill_items_bill')
+
+    with op.batch_alter_table('bills', schema=None) as batch_op:
+        batch_op.drop_index('ix_bills_billing_date')
+        batch_op.drop_index('ix_bills_store_billing_date')
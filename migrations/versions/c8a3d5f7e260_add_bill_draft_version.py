@@ -0,0 +1,26 @@
+"""add bill draft version
+
+Revision ID: c8a3d5f7e260
+Revises: b6e8f2a4c159
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8a3d5f7e260'
+down_revision = 'b6e8f2a4c159'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bills', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('draft_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('bills', schema=None) as batch_op:
+        batch_op.drop_column('draft_version')
@@ -0,0 +1,27 @@
+"""add bill status
+
+Revision ID: d5f1b8c9e402
+Revises: c7e9a3b5d214
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f1b8c9e402'
+down_revision = 'c7e9a3b5d214'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing bills were all created final
+    with op.batch_alter_table('bills', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=10), nullable=False, server_default='final'))
+
+
+def downgrade():
+    with op.batch_alter_table('bills', schema=None) as batch_op:
+        batch_op.drop_column('status')
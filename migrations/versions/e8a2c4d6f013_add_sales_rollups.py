@@ -0,0 +1,35 @@
+"""add sales rollups
+
+Revision ID: e8a2c4d6f013
+Revises: d5f1b8c9e402
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a2c4d6f013'
+down_revision = 'd5f1b8c9e402'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Backfill existing bills afterwards with `flask rebuild-sales-rollups`
+    op.create_table('sales_rollups',
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.BigInteger(), nullable=False),
+    sa.Column('gst', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['store_id'], ['stores.id'], ),
+    sa.PrimaryKeyConstraint('store_id', 'day', 'product_id')
+    )
+
+
+def downgrade():
+    op.drop_table('sales_rollups')
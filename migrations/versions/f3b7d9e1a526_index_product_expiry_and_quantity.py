@@ -0,0 +1,28 @@
+"""index product expiry and quantity
+
+Revision ID: f3b7d9e1a526
+Revises: e8a2c4d6f013
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7d9e1a526'
+down_revision = 'e8a2c4d6f013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.create_index('ix_products_store_expire', ['store_id', 'expire'], unique=False)
+        batch_op.create_index('ix_products_store_quantity', ['store_id', 'quantity'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('products', schema=None) as batch_op:
+        batch_op.drop_index('ix_products_store_quantity')
+        batch_op.drop_index('ix_products_store_expire')
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+
+# Importing mainSite builds the app, so point it at throwaway databases first
+_tmp = tempfile.mkdtemp()
+os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+os.environ['SECRET_KEY'] = 'test'
+os.environ['TOKEN_DB_PATH'] = os.path.join(_tmp, 'tokens.db')
+os.environ['JOBS_DB_PATH'] = os.path.join(_tmp, 'jobs.db')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import pytest
+from mainSite import app
+from mainSite.extensions import db
+
+@pytest.fixture
+def engine():
+    app.config['TESTING'] = True
+    # Requests push their own app context only when none is active, and
+    # Flask-Login keeps the loaded user on it, so the tests don't hold one open
+    with app.app_context():
+        db.create_all()
+        engine = db.engine
+    yield engine
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
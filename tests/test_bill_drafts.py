@@ -0,0 +1,92 @@
+import pytest
+from mainSite import app
+from mainSite.extensions import db, socket
+from mainSite.models import User, Store, Product, Bill, SalesRollup
+from mainSite.bill_drafts import drafts, load_draft
+from conftest import login
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    monkeypatch.setitem(app.config, 'WTF_CSRF_ENABLED', False)
+    yield app.test_client()
+    drafts._drafts.clear()
+
+def make_draft(quantity):
+    """A user, a store with 10 units of one product and a saved draft billing quantity of them."""
+    with app.app_context():
+        user = User.create_user(name='Owner', phone='9000000001', gstno='X' * 15, password='unused')
+        store = Store.create_store(user.id, 'Store', None, phone='9000000001', owner='Owner')
+        product = Product.create_product(store.id, 'Product', 10, 12, 5.0)
+        bill_id = Bill.create_draft(store).id
+        drafts.apply(bill_id, {'op': 'add', 'product_id': product.id, 'quantity': quantity})
+        assert drafts.save(drafts.get(bill_id))
+        return user.id, product.id, bill_id
+
+def test_a_draft_is_finalized_once_across_cached_copies(client):
+    user_id, product_id, bill_id = make_draft(3)
+    with app.app_context():
+        # What another worker process has cached for the same draft
+        other = load_draft(bill_id)
+    login(client, user_id)
+    assert client.post(f'/api/bills/{bill_id}/finalize').status_code == 200
+
+    drafts._drafts[bill_id] = other
+    response = client.post(f'/api/bills/{bill_id}/finalize')
+    assert response.status_code == 409
+    assert bill_id not in drafts._drafts
+    with app.app_context():
+        assert db.session.get(Product, product_id).quantity == 7
+        assert db.session.query(db.func.sum(SalesRollup.quantity)).scalar() == 3
+
+def test_a_copy_saved_over_elsewhere_is_not_finalized(client):
+    user_id, product_id, bill_id = make_draft(3)
+    with app.app_context():
+        other = load_draft(bill_id)
+        # The draft's own process saves a newer edit after the other copy was loaded
+        drafts.apply(bill_id, {'op': 'add', 'product_id': product_id, 'quantity': 2})
+        assert drafts.save(drafts.get(bill_id))
+    drafts._drafts[bill_id] = other
+    login(client, user_id)
+    assert client.post(f'/api/bills/{bill_id}/finalize').status_code == 409
+
+    # The reloaded draft bills the newer saved lines
+    response = client.post(f'/api/bills/{bill_id}/finalize')
+    assert response.status_code == 200
+    assert [item['quantity'] for item in response.get_json()['items']] == [5]
+    with app.app_context():
+        assert db.session.get(Product, product_id).quantity == 5
+
+def test_a_draft_bills_the_price_its_lines_were_added_at(client):
+    user_id, product_id, bill_id = make_draft(3)
+    with app.app_context():
+        Product.edit_product(product_id, mrp=20.0)
+        # Evicted and reloaded from the saved lines
+        drafts.discard(bill_id)
+        assert [line.mrp for line in drafts.get(bill_id).lines.values()] == [5.0]
+    login(client, user_id)
+    response = client.post(f'/api/bills/{bill_id}/finalize')
+    assert response.status_code == 200
+    assert [item['mrp'] for item in response.get_json()['items']] == [5.0]
+
+def test_a_lost_save_resyncs_the_bill_room(client, monkeypatch):
+    emitted = []
+    monkeypatch.setattr(socket, 'emit', lambda event, data, to=None: emitted.append((event, data, to)))
+    user_id, product_id, bill_id = make_draft(3)
+    with app.app_context():
+        other = load_draft(bill_id)
+        drafts.apply(bill_id, {'op': 'add', 'product_id': product_id, 'quantity': 2})
+        assert drafts.save(drafts.get(bill_id))
+        drafts._drafts[bill_id] = other
+        drafts.apply(bill_id, {'op': 'add', 'product_id': product_id, 'quantity': 1})
+        assert not drafts.save(other)
+
+        event, state, room = emitted[-1]
+        assert (event, room) == ('bill_state', f'bill:{bill_id}')
+        assert [line['quantity'] for line in state['lines']] == [5]
+        assert drafts._drafts[bill_id] is not other
+
+        Bill.query.filter_by(id=bill_id).update({'status': 'final'})
+        db.session.commit()
+        drafts.apply(bill_id, {'op': 'add', 'product_id': product_id, 'quantity': 1})
+        assert not drafts.save(drafts.get(bill_id))
+        assert emitted[-1][0] == 'bill_error'
@@ -0,0 +1,32 @@
+import pytest
+from mainSite.bill_totals import compute_totals
+
+pytest.importorskip('numpy')
+
+# (quantity, mrp, discount_percent, gst_percent, bill_id) per line
+LINES = [
+    (3, 12.5, 0.0, 12.0, 1),
+    (1, 99.99, 10.0, 18.0, 1),
+    (2, 0.0, 0.0, 5.0, 1),      # a free line is still on the 5% slab
+    (0, 40.0, 0.0, 28.0, 2),    # so is a line with no units
+    (4, 1.01, 50.0, 12.0, 2),
+    (1, 250.0, 100.0, 0.0, 3),
+    (7, 3.33, 2.5, 12.0, 3),
+]
+
+def columns(lines):
+    quantity, mrp, discount, gst, bill_ids = (list(column) for column in zip(*lines))
+    return quantity, mrp, discount, gst, bill_ids
+
+@pytest.mark.parametrize('lines', [LINES, LINES[2:4], LINES[:1]])
+def test_numpy_and_python_group_bills_alike(lines):
+    quantity, mrp, discount, gst, bill_ids = columns(lines)
+    with_numpy = compute_totals(quantity, mrp, discount, gst, bill_ids=bill_ids, use_numpy=True)
+    without = compute_totals(quantity, mrp, discount, gst, bill_ids=bill_ids, use_numpy=False)
+    assert with_numpy == without
+
+def test_numpy_and_python_total_one_bill_alike():
+    quantity, mrp, discount, gst, _ = columns(LINES)
+    with_numpy = compute_totals(quantity, mrp, discount, gst, use_numpy=True)
+    assert with_numpy == compute_totals(quantity, mrp, discount, gst, use_numpy=False)
+    assert set(with_numpy['slabs']) == {0, 5, 12, 18, 28}
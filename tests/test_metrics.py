@@ -0,0 +1,14 @@
+import pytest
+from mainSite import app, metrics
+
+@pytest.mark.parametrize('token, authorization, status', [
+    (None, None, 404),
+    (None, 'Bearer ', 404),
+    ('secret', None, 403),
+    ('secret', 'Bearer wrong', 403),
+    ('secret', 'Bearer secret', 200),
+])
+def test_metrics_need_a_configured_token(engine, monkeypatch, token, authorization, status):
+    monkeypatch.setattr(metrics, 'METRICS_TOKEN', token)
+    headers = {'Authorization': authorization} if authorization else {}
+    assert app.test_client().get('/metrics', headers=headers).status_code == status
@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import event
+from mainSite import app
+from mainSite.models import User, Store, Product
+from conftest import login
+
+def make_user(phone, stores):
+    """A user with the given number of stores, store n holding n + 1 products. Returns the user's id."""
+    with app.app_context():
+        user = User.create_user(name='Owner', phone=phone, gstno='X' * 15, password='unused')
+        for n in range(stores):
+            store = Store.create_store(user.id, f'Store {n}', None, phone=phone, owner='Owner')
+            for p in range(n + 1):
+                Product.create_product(store.id, f'Product {p}', 10, 12, 5.0)
+        return user.id
+
+def count_queries(engine, user_id, path):
+    client = app.test_client()
+    login(client, user_id)
+    # Warm the user cache, then count what the listing itself costs
+    assert client.get(path).status_code == 200
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200
+    return len(statements), response.get_json()
+
+@pytest.mark.parametrize('path', ['/api/get_stores', '/api/stores_paginated?per_page=9'])
+def test_store_listing_query_count_does_not_grow_with_stores(engine, path):
+    one = make_user('9000000001', 1)
+    nine = make_user('9000000009', 9)
+    queries_for_one, _ = count_queries(engine, one, path)
+    queries_for_nine, body = count_queries(engine, nine, path)
+    # One aggregate for the ETag validators, one for the stores with their counts
+    assert queries_for_nine == queries_for_one == 2
+    assert sorted(store['total_products'] for store in body['stores']) == list(range(1, 10))
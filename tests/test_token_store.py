@@ -0,0 +1,53 @@
+import threading
+import pytest
+from mainSite.token_store import TokenStore, MemoryTokenStore, SQLiteTokenStore
+
+RACERS = 32
+
+@pytest.fixture(params=['sqlite', 'memory'])
+def stores(request, tmp_path):
+    """The stores racers call into: two SQLite stores on one file stand in for two worker processes."""
+    if request.param == 'memory':
+        return [MemoryTokenStore(purge_interval=0)]
+    path = str(tmp_path / 'tokens.db')
+    return [SQLiteTokenStore(path, purge_interval=0), SQLiteTokenStore(path, purge_interval=0)]
+
+def race(stores, consume):
+    """Calls consume(store) from RACERS threads at once and returns how many got True."""
+    barrier = threading.Barrier(RACERS)
+    results = []
+
+    def racer(store):
+        barrier.wait()
+        results.append(consume(store))
+
+    threads = [threading.Thread(target=racer, args=(stores[i % len(stores)],)) for i in range(RACERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results.count(True)
+
+def test_a_publish_token_is_consumed_once(stores):
+    token = stores[0].issue_publish_token()
+    assert race(stores, lambda store: store.consume_publish_token(token)) == 1
+    assert not stores[0].consume_publish_token(token)
+
+def test_an_otp_is_consumed_once(stores):
+    stores[0].store_otp('owner@example.com', '123456')
+    assert race(stores, lambda store: store.consume_otp('owner@example.com', '123456')) == 1
+    assert not stores[0].consume_otp('owner@example.com', '123456')
+
+def test_an_incomplete_backend_cannot_be_created():
+    class NoOtps(TokenStore):
+        def add_publish_token(self, token):
+            pass
+
+        def consume_publish_token(self, token):
+            return False
+
+        def purge_expired(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        NoOtps(purge_interval=0)